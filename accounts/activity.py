@@ -0,0 +1,114 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, models
+from django.utils import timezone
+
+from base import utils as base_utils
+from accounts.models import UserProfile
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker(object):
+    """
+    Write-behind tracking of user logins and authenticated requests.
+
+    Events are kept in an in-memory buffer holding the latest timestamps per
+    user, and written with one ``UPDATE ... SET col = CASE id WHEN ... END``
+    per chunk of users by a background thread, every
+    ``ACTIVITY_FLUSH_INTERVAL_SECONDS`` or as soon as the buffer holds
+    ``ACTIVITY_BUFFER_MAX_USERS`` users, off the request threads. The thread
+    is started by the first event of each process (forked workers included).
+    Up to one interval of activity may be lost if the process dies.
+
+    """
+
+    FLUSH_CHUNK_SIZE = 500
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.logins = {}
+        self.hits = {}
+        self.wake = threading.Event()
+        self.pid = None
+
+    def get_flush_interval(self):
+        return getattr(settings, 'ACTIVITY_FLUSH_INTERVAL_SECONDS', 60)
+
+    def get_max_users(self):
+        return getattr(settings, 'ACTIVITY_BUFFER_MAX_USERS', 10000)
+
+    def record_login(self, user_id):
+        now = timezone.now()
+        with self.lock:
+            self.logins[user_id] = now
+            self.hits[user_id] = now
+        self.flush_if_due()
+
+    def record_hit(self, user_id):
+        with self.lock:
+            self.hits[user_id] = timezone.now()
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """
+        Starts the flushing thread of this process if needed, and wakes it
+        up when the buffer is full.
+
+        """
+
+        with self.lock:
+            if self.pid != os.getpid():
+                # Threads don't survive a fork: start one per process.
+                self.pid = os.getpid()
+                thread = threading.Thread(target=self.run, name='activity-flush')
+                thread.daemon = True
+                thread.start()
+            full = len(self.hits) >= self.get_max_users()
+        if full:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.get_flush_interval())
+            self.wake.clear()
+            self.flush()
+            # Not held between flushes.
+            connection.close()
+
+    def flush(self):
+        """
+        Writes the buffered activity to the database.
+
+        """
+
+        with self.lock:
+            logins, self.logins = self.logins, {}
+            hits, self.hits = self.hits, {}
+
+        try:
+            self.write(User.objects.all(), 'pk', 'last_login', logins)
+            self.write(UserProfile.objects.all(), 'user_id', 'last_activity', hits)
+        except Exception:
+            logger.exception("Failed to flush user activity.")
+
+    def write(self, queryset, key, field, values):
+        for chunk in base_utils.chunked(sorted(values), self.FLUSH_CHUNK_SIZE):
+            queryset.filter(**{'%s__in' % key: chunk}).update(**{
+                field: models.Case(
+                    *[models.When(then=models.Value(values[pk]), **{key: pk}) for pk in chunk],
+                    output_field=models.DateTimeField()
+                )
+            })
+
+
+tracker = ActivityTracker()
+
+atexit.register(tracker.flush)
@@ -1,20 +1,39 @@
 import base64
-from django.contrib.auth import get_user_model
+from collections import OrderedDict
+from django.contrib.auth import get_user_model, password_validation
 from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.auth.tokens import default_token_generator
+from django.db import IntegrityError
 from django.db.models import Q
+from django.utils import six
 from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token
 
+from base import serializers as base_serializers
 from base import utils as base_utils
-from accounts.models import UserProfile
+from accounts import registration
+from accounts.authentication import get_access_token_lifetime, issue_access_token, signed_access_tokens_enabled
+from accounts.models import AuthToken, UserProfile
 from teams.models import TeamInvitation
-from teams.api.serializers import TeamSerializer
+from teams.api.serializers import TeamRowSerializer, TeamSerializer
 
 User = get_user_model()
 
 
+def run_password_validators(password, user=None):
+    """
+    Runs the validators of ``AUTH_PASSWORD_VALIDATORS`` on given password,
+    raising their messages as a serializer validation error.
+
+    """
+
+    try:
+        password_validation.validate_password(password, user=user)
+    except DjangoValidationError as e:
+        raise serializers.ValidationError(list(e.messages))
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
 
     email = serializers.EmailField(
@@ -24,12 +43,14 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     password = serializers.CharField(
         required=True,
+        write_only=True,
         label="Password",
         style={'input_type': 'password'}
     )
 
     password_2 = serializers.CharField(
         required=True,
+        write_only=True,
         label="Confirm Password",
         style={'input_type': 'password'}
     )
@@ -49,10 +70,29 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta(object):
         model = User
         fields = ['username', 'email', 'password', 'password_2', 'first_name', 'last_name', 'invite_code']
+        extra_kwargs = {
+            # Without the UniqueValidator, checked along with the email in ``get_conflicts``.
+            'username': {'validators': User._meta.get_field('username').validators},
+        }
+
+    EMAIL_EXISTS_MESSAGE = "Email already exists."
+
+    USERNAME_EXISTS_MESSAGE = User._meta.get_field('username').error_messages['unique']
+
+    def get_conflicts(self):
+        # Email and username are checked together, in one query, on first use.
+        if not hasattr(self, '_conflicts'):
+            data = self.get_initial()
+            email, username = data.get('email'), data.get('username')
+            self._conflicts = UserProfile.objects.registration_conflicts(
+                email.strip() if isinstance(email, six.string_types) else None,
+                username.strip() if isinstance(username, six.string_types) else None
+            )
+        return self._conflicts
 
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Email already exists.")
+        if 'email' in self.get_conflicts():
+            raise serializers.ValidationError(self.EMAIL_EXISTS_MESSAGE)
         return value
 
     def validate_password(self, value):
@@ -60,6 +100,14 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Password should be atleast %s characters long." % getattr(settings, 'PASSWORD_MIN_LENGTH', 8)
             )
+        data = self.get_initial()
+        user = User(
+            username=data.get('username'),
+            email=data.get('email'),
+            first_name=data.get('first_name'),
+            last_name=data.get('last_name')
+        )
+        run_password_validators(value, user=user)
         return value
 
     def validate_password_2(self, value):
@@ -70,8 +118,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return value
 
     def validate_username(self, value):
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Email already exists.")
+        if 'username' in self.get_conflicts():
+            raise serializers.ValidationError(self.USERNAME_EXISTS_MESSAGE)
         return value
 
     def validate_invite_code(self, value):
@@ -81,7 +129,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             self.invitation = TeamInvitation.objects.validate_code(email, value)
             if not self.invitation:
                 raise serializers.ValidationError("Invite code is not valid / expired.")
-            self.team = self.invitation.invited_by.team.last()
+            self.team = self.invitation.team or self.invitation.invited_by.team.last()
         return value
 
     def create(self, validated_data):
@@ -96,13 +144,33 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         }
 
         is_active = True if team else False
+        # Registrations without an invitation can be committed in groups (see ``accounts.registration``).
+        group_commit = not team and registration.group_commit_enabled()
 
-        user = UserProfile.objects.create_user_profile(
-                data=user_data,
-                is_active=is_active,
-                site=get_current_site(self.context['request']),
-                send_email=True
-            )
+        try:
+            if group_commit:
+                user = registration.batcher.create(
+                    UserProfile.objects.build_user(user_data, is_active=is_active),
+                    site=get_current_site(self.context['request'])
+                )
+            else:
+                user = UserProfile.objects.create_user_profile(
+                    data=user_data,
+                    is_active=is_active,
+                    site=get_current_site(self.context['request']),
+                    send_email=True
+                )
+        except IntegrityError:
+            # A concurrent registration took the email / username after validation.
+            conflicts = UserProfile.objects.registration_conflicts(user_data['email'], user_data['username'])
+            errors = {}
+            if 'email' in conflicts:
+                errors['email'] = [self.EMAIL_EXISTS_MESSAGE]
+            if 'username' in conflicts:
+                errors['username'] = [self.USERNAME_EXISTS_MESSAGE]
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors)
 
         if team:
             team.members.add(user)
@@ -110,7 +178,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         if hasattr(self, 'invitation'):
             TeamInvitation.objects.accept_invitation(self.invitation)
 
-        TeamInvitation.objects.decline_pending_invitations(email_ids=[validated_data.get('email')])
+        if not group_commit:
+            TeamInvitation.objects.decline_pending_invitations(email_ids=[validated_data.get('email')])
 
         return validated_data
 
@@ -171,14 +240,48 @@ class UserLoginSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Invalid credentials.")
 
         if user_obj.is_active:
-            token, created = Token.objects.get_or_create(user=user_obj)
-            data['token'] = token
+            data['token'] = AuthToken.objects.issue(user_obj)
         else:
             raise serializers.ValidationError("User not active.")
 
         return data
 
 
+class AccessTokenRefreshSerializer(serializers.Serializer):
+
+    token = serializers.CharField(
+        required=True,
+        write_only=True
+    )
+
+    access_token = serializers.CharField(
+        read_only=True
+    )
+
+    expires_in = serializers.IntegerField(
+        read_only=True
+    )
+
+    def validate(self, data):
+        if not signed_access_tokens_enabled():
+            raise serializers.ValidationError("Access tokens are not enabled.")
+
+        try:
+            token = AuthToken.objects.select_related('user').get(key=data.get('token'))
+        except AuthToken.DoesNotExist:
+            raise serializers.ValidationError("Invalid token.")
+
+        if token.is_expired():
+            raise serializers.ValidationError("Token has expired.")
+        if not token.user.is_active:
+            raise serializers.ValidationError("User not active.")
+
+        token.touch()
+        data['access_token'] = issue_access_token(token.user)
+        data['expires_in'] = get_access_token_lifetime()
+        return data
+
+
 class PasswordResetSerializer(serializers.Serializer):
 
     email = serializers.EmailField(
@@ -223,6 +326,10 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         write_only=True
     )
 
+    def validate_new_password(self, value):
+        run_password_validators(value, user=getattr(self, 'user', None))
+        return value
+
     def validate_new_password_2(self, value):
         data = self.get_initial()
         new_password = data.get('new_password')
@@ -238,12 +345,20 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
 
 class UserSerializer(serializers.ModelSerializer):
 
-    team = TeamSerializer(many=True)
+    team = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['email', 'first_name', 'last_name', 'team']
 
+    def get_team(self, obj):
+        # Read from the denormalized ``UserProfile.team``, keeping the list shape of the M2M.
+        try:
+            team = obj.userprofile.team
+        except ObjectDoesNotExist:
+            team = obj.team.last()
+        return TeamSerializer([team] if team else [], many=True).data
+
 
 class UserProfileSerializer(serializers.ModelSerializer):
 
@@ -253,3 +368,52 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = ['user', 'has_email_verified']
 
+
+class UserRowSerializer(base_serializers.RowSerializer):
+    """
+    Fast-path equivalent of ``UserSerializer`` for ``values()`` rows.
+    ``team`` is rendered by ``UserProfileRowSerializer``.
+
+    """
+
+    fields = ['email', 'first_name', 'last_name']
+
+
+class UserProfileRowSerializer(base_serializers.RowSerializer):
+    """
+    Fast-path equivalent of ``UserProfileSerializer``, rendering a single
+    ``UserProfile.objects.values(*serializer.lookups)`` row.
+
+    """
+
+    fields = ['has_email_verified']
+
+    def __init__(self, prefix=''):
+        super(UserProfileRowSerializer, self).__init__(prefix=prefix)
+        self.user = UserRowSerializer(prefix=prefix + 'user__')
+        self.team = TeamRowSerializer(prefix=prefix + 'team__')
+
+    @property
+    def lookups(self):
+        return self.user.lookups + self.team.lookups + super(UserProfileRowSerializer, self).lookups
+
+    def to_representation(self, row):
+        user = self.user.to_representation(row)
+        # A list, as the ``Team.members`` relation was exposed before ``UserProfile.team``.
+        user['team'] = [] if row[self.team.prefix + 'id'] is None else [self.team.to_representation(row)]
+        return OrderedDict([('user', user), ('has_email_verified', row[self.prefix + 'has_email_verified'])])
+
+
+class UserLoginResponseSerializer(object):
+    """
+    Fast-path equivalent of ``UserLoginSerializer(...).data``, given the issued token.
+
+    """
+
+    def to_representation(self, token):
+        return OrderedDict([('token', token.key)])
+
+
+user_profile_row_serializer = UserProfileRowSerializer()
+
+user_login_response_serializer = UserLoginResponseSerializer()
@@ -9,6 +9,10 @@ urlpatterns = [
         views.UserLoginAPIView.as_view(),
         name='login'),
 
+    url(r'^token/refresh/$',
+        views.AccessTokenRefreshAPIView.as_view(),
+        name='token_refresh'),
+
     url(r'^register/$',
         views.UserRegistrationAPIView.as_view(),
         name='register'),
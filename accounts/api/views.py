@@ -1,10 +1,20 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.contrib.sites.shortcuts import get_current_site
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
 from rest_framework import generics, permissions, status, views
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.response import Response
 
-from accounts.models import UserProfile
+from base.idempotency import idempotent
+from accounts.activity import tracker
+from accounts.authentication import (
+    ExpiringTokenAuthentication, SignedTokenAuthentication,
+    get_access_token_lifetime, issue_access_token, signed_access_tokens_enabled
+)
+from accounts.models import AuthToken, UserProfile
 from . import serializers
 
 User = get_user_model()
@@ -20,6 +30,10 @@ class UserRegistrationAPIView(generics.CreateAPIView):
     serializer_class = serializers.UserRegistrationSerializer
     queryset = User.objects.all()
 
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super(UserRegistrationAPIView, self).post(request, *args, **kwargs)
+
 
 class UserEmailVerificationAPIView(views.APIView):
     """
@@ -41,12 +55,37 @@ class UserEmailVerificationAPIView(views.APIView):
 
 class UserLoginAPIView(views.APIView):
     """
-    Endpoint for user login. Returns authentication token on success.
+    Endpoint for user login. Returns authentication token on success,
+    along with a signed access token if ``SIGNED_ACCESS_TOKENS`` is turned on.
 
     """
 
     permission_classes = (permissions.AllowAny, )
     serializer_class = serializers.UserLoginSerializer
+    response_serializer = serializers.user_login_response_serializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid(raise_exception=True):
+            token = serializer.validated_data['token']
+            tracker.record_login(token.user_id)
+            data = self.response_serializer.to_representation(token)
+            if signed_access_tokens_enabled():
+                data['access_token'] = issue_access_token(token.user)
+                data['expires_in'] = get_access_token_lifetime()
+            return Response(data, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AccessTokenRefreshAPIView(views.APIView):
+    """
+    Endpoint to obtain a new signed access token given the authentication token.
+
+    """
+
+    permission_classes = (permissions.AllowAny, )
+    serializer_class = serializers.AccessTokenRefreshSerializer
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -66,17 +105,41 @@ class PasswordResetAPIView(views.APIView):
     serializer_class = serializers.PasswordResetSerializer
 
     def post(self, request):
-        user_profile = self.get_user_profile(request.data.get('email'))
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            # Answered as any other email, without an error, for privacy.
+            return Response(status=status.HTTP_200_OK)
+
+        email = serializer.validated_data['email']
+        if not self.is_first_request(email):
+            # A reset for this email was already handled within the coalescing window.
+            return Response(status=status.HTTP_200_OK)
+
+        user_profile = self.get_user_profile(email)
         if user_profile:
             user_profile.send_password_reset_email(
                 site=get_current_site(request)
-            )  # To be made asynchronous in production
+            )  # Sent by the dispatch_emails command
             return Response(status=status.HTTP_200_OK)
 
         # Forcing Http status to 200 even if failure to support user privacy.
         # Will show message at frontend like "If the email is valid, you must have received password reset email"
         return Response(status=status.HTTP_200_OK)
 
+    def is_first_request(self, email):
+        """
+        Returns ``True`` for the first reset request of an email address within
+        ``PASSWORD_RESET_COALESCE_SECONDS``, otherwise ``False``.
+        ``cache.add`` is atomic, so concurrent requests can't both pass.
+
+        """
+
+        window = getattr(settings, 'PASSWORD_RESET_COALESCE_SECONDS', 300)
+        if not window:
+            return True
+        key = 'password_reset:%s' % hashlib.sha1(email.strip().lower().encode('utf-8')).hexdigest()
+        return cache.add(key, True, window)
+
     def get_user_profile(self, email):
         try:
             user_profile = UserProfile.objects.get(user__email=email)
@@ -108,6 +171,7 @@ class PasswordResetConfirmView(views.APIView):
             user = serializer.user
             user.set_password(new_password)
             user.save()
+            AuthToken.objects.rotate(user)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -117,12 +181,62 @@ class UserProfileAPIView(generics.RetrieveAPIView):
     """
     Endpoint to retrieve user profile.
 
+    The profile is read as a single ``values()`` row and rendered with
+    ``UserProfileRowSerializer``. The response carries an ``ETag`` computed
+    from the same row, and a request with a matching ``If-None-Match`` gets
+    a 304 without serializing. There is no ``Last-Modified``: user fields and
+    team counters change without touching any timestamp.
+
     """
 
     permission_classes = (permissions.IsAuthenticated, )
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication, )
     serializer_class = serializers.UserProfileSerializer
+    row_serializer = serializers.user_profile_row_serializer
+
+    # Everything the representation depends on. ``User`` has no update timestamp and
+    # the team counters are updated in place, so those are part of the version as well.
+    VERSION_FIELDS = (
+        'timestamp_updated', 'has_email_verified',
+        'user__email', 'user__first_name', 'user__last_name',
+        'team_id', 'team__timestamp_updated', 'team__member_count', 'team__pending_invitation_count',
+    )
 
     def get_object(self):
-        return self.request.user.userprofile
+        return UserProfile.objects.select_related('user', 'team').get(user=self.request.user)
+
+    def get_row(self):
+        """
+        Returns the profile of requesting user as a ``values()`` row holding
+        both the version and the representation, or ``None`` if the user has no profile.
+
+        """
+
+        return UserProfile.objects.filter(
+            user_id=self.request.user.pk
+        ).values(*(self.VERSION_FIELDS + self.row_serializer.lookups)).first()
+
+    def get_version(self, row):
+        """
+        Returns the ``ETag`` of given profile row.
+
+        """
+
+        etag = hashlib.md5(
+            u'|'.join(u'%s' % row[field] for field in self.VERSION_FIELDS).encode('utf-8')
+        ).hexdigest()
+        return quote_etag(etag)
+
+    def get(self, request, *args, **kwargs):
+        row = self.get_row()
+        if row is None:
+            return super(UserProfileAPIView, self).get(request, *args, **kwargs)
+
+        etag = self.get_version(row)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(self.row_serializer.to_representation(row))
 
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from accounts.activity import tracker
+from accounts.models import AuthToken
+
+User = get_user_model()
+
+ACCESS_TOKEN_SALT = 'accounts.access_token'
+
+
+def signed_access_tokens_enabled():
+    return getattr(settings, 'SIGNED_ACCESS_TOKENS', False)
+
+
+def get_access_token_lifetime():
+    return getattr(settings, 'SIGNED_ACCESS_TOKEN_LIFETIME_SECONDS', 5 * 60)
+
+
+def issue_access_token(user):
+    """
+    Returns a signed access token carrying the user id and active flag.
+    The issue time is added by the signer.
+
+    """
+
+    return signing.dumps({'u': user.pk, 'a': user.is_active}, salt=ACCESS_TOKEN_SALT)
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication backed by ``AuthToken``, rejecting expired tokens
+    and extending the expiry of the ones in use.
+    The authenticated request is recorded as user activity (see ``accounts.activity``).
+
+    """
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        user, token = super(ExpiringTokenAuthentication, self).authenticate_credentials(key)
+        if token.is_expired():
+            raise exceptions.AuthenticationFailed("Token has expired.")
+        token.touch()
+        tracker.record_hit(user.pk)
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Stateless authentication with the signed access tokens issued when
+    ``SIGNED_ACCESS_TOKENS`` is turned on. The signature and age are verified
+    in-process, without any database query.
+
+    Clients should authenticate by passing the access token in the "Authorization"
+    HTTP header, prepended with the string "Bearer ".
+
+    The user is built with only its id and active flag loaded; any other field
+    is fetched from the database the first time it is accessed.
+
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if not signed_access_tokens_enabled():
+            raise exceptions.AuthenticationFailed("Access tokens are not enabled.")
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid access token header.")
+
+        try:
+            payload = signing.loads(
+                auth[1].decode(), salt=ACCESS_TOKEN_SALT, max_age=get_access_token_lifetime()
+            )
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed("Access token has expired.")
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed("Invalid access token.")
+
+        if not payload.get('a'):
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+        tracker.record_hit(payload['u'])
+        return self.get_user(payload['u']), auth[1].decode()
+
+    def get_user(self, user_id):
+        loaded = {User._meta.pk.attname: user_id, 'is_active': True}
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+        return User.from_db(DEFAULT_DB_ALIAS, field_names, [loaded[name] for name in field_names])
+
+    def authenticate_header(self, request):
+        return self.keyword
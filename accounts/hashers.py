@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher whose iterations are taken from ``PASSWORD_PBKDF2_ITERATIONS``,
+    as recommended by the ``calibrate_password_hashers`` command.
+
+    The algorithm name is unchanged, so existing hashes keep verifying and are
+    upgraded to the configured iterations on the next successful login
+    (``check_password`` rehashes whenever ``must_update`` is true).
+
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
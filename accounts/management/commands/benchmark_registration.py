@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import WSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test.testcases import QuietWSGIRequestHandler
+from django.test.utils import override_settings
+from django.utils.six.moves import http_client, socketserver, urllib
+
+User = get_user_model()
+
+REGISTER_PATH = '/api/accounts/register/'
+FAST_PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class ThreadedWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    # As ``runserver`` builds it.
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    """
+    Compares the throughput of concurrent registrations committed one by one
+    and in groups (``REGISTRATION_GROUP_COMMIT``), with ``--threads`` clients
+    posting to the registration endpoint over HTTP, through the whole
+    middleware stack (``ConcurrencyLimitMiddleware`` included).
+
+    By default, each mode is served in process by a threaded server on an
+    ephemeral port, built with the mode's settings, on the configured
+    database; the users created are deleted afterwards. Password hashing
+    dominates a registration: ``--fast-hasher`` hashes with MD5 instead,
+    so that the inserts and commits are measured.
+
+    With ``--base-url``, a running server is benchmarked instead, in the
+    mode it is configured with; point it at a disposable database.
+
+    Requests shed by the concurrency limits (503) are not retried; they are
+    counted with the other statuses.
+
+    """
+
+    help = 'Benchmarks registration throughput over HTTP with and without group commit.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registrations', dest='registrations', type=int, default=2000)
+        parser.add_argument('--threads', dest='threads', type=int, default=16)
+        parser.add_argument('--max-size', dest='max_size', type=int, default=100,
+                            help="REGISTRATION_BATCH_MAX_SIZE to benchmark with.")
+        parser.add_argument('--max-delay-ms', dest='max_delay_ms', type=float, default=5,
+                            help="REGISTRATION_BATCH_MAX_DELAY_MS to benchmark with.")
+        parser.add_argument('--fast-hasher', dest='fast_hasher', action='store_true', default=False,
+                            help="Hash passwords with MD5, to measure the writes.")
+        parser.add_argument('--base-url', dest='base_url', default=None,
+                            help="Benchmark a running server instead.")
+        parser.add_argument('--timeout', dest='timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if options['registrations'] < 1 or options['threads'] < 1:
+            raise CommandError("--registrations and --threads should be positive integers.")
+        self.options = options
+        prefix = 'benchmark-%s-' % uuid.uuid4().hex[:8]
+
+        self.stdout.write("%-14s %13s %8s %10s %10s  %s" % (
+            'mode', 'registrations', 'per s', 'p50 (ms)', 'p99 (ms)', 'statuses'
+        ))
+
+        if options['base_url']:
+            url = urllib.parse.urlsplit(options['base_url'])
+            if url.scheme not in ('http', 'https'):
+                raise CommandError("--base-url should be a http(s) URL.")
+            self.report('server', *self.run(url, prefix))
+            return
+
+        overrides = {
+            'REGISTRATION_BATCH_MAX_SIZE': options['max_size'],
+            'REGISTRATION_BATCH_MAX_DELAY_MS': options['max_delay_ms'],
+        }
+        if options['fast_hasher']:
+            overrides['PASSWORD_HASHERS'] = FAST_PASSWORD_HASHERS
+        try:
+            with override_settings(**overrides):
+                for mode, group_commit in (('one by one', False), ('group commit', True)):
+                    with override_settings(REGISTRATION_GROUP_COMMIT=group_commit):
+                        self.report(mode, *self.serve_and_run(prefix + mode[0]))
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+
+    def serve_and_run(self, prefix):
+        # The handler loads the middleware, and so the concurrency limits, with the current settings.
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+        server.set_app(get_wsgi_application())
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            return self.run(urllib.parse.urlsplit('http://127.0.0.1:%d' % server.server_address[1]), prefix)
+        finally:
+            server.shutdown()
+            server.server_close()
+            connections.close_all()
+
+    def run(self, url, prefix):
+        latencies = []
+        statuses = []
+        lock = threading.Lock()
+        counter = iter(range(self.options['registrations']))
+
+        def client():
+            connection = self.connect(url)
+            try:
+                while True:
+                    with lock:
+                        index = next(counter, None)
+                    if index is None:
+                        return
+                    started = time.time()
+                    try:
+                        connection.request('POST', url.path.rstrip('/') + REGISTER_PATH,
+                                           body=self.build_body('%s%d' % (prefix, index)),
+                                           headers={'Content-Type': 'application/json'})
+                        response = connection.getresponse()
+                        response.read()
+                        status = response.status
+                        if response.getheader('Connection', '').lower() == 'close':
+                            connection.close()
+                            connection = self.connect(url)
+                    except (http_client.HTTPException, IOError):
+                        connection.close()
+                        connection = self.connect(url)
+                        status = 0
+                    latency = time.time() - started
+                    with lock:
+                        statuses.append(status)
+                        if status == 201:
+                            latencies.append(latency)
+            finally:
+                connection.close()
+
+        started = time.time()
+        clients = [threading.Thread(target=client) for _ in range(self.options['threads'])]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return sorted(latencies), statuses, time.time() - started
+
+    def build_body(self, username):
+        # Unrelated to the username, for ``UserAttributeSimilarityValidator``.
+        password = uuid.uuid4().hex
+        return json.dumps({'username': username, 'email': '%s@example.com' % username,
+                           'first_name': 'Benchmark', 'last_name': 'User',
+                           'password': password, 'password_2': password})
+
+    def connect(self, url):
+        connection_class = http_client.HTTPSConnection if url.scheme == 'https' else http_client.HTTPConnection
+        return connection_class(url.hostname, url.port, timeout=self.options['timeout'])
+
+    def report(self, mode, latencies, statuses, elapsed):
+        self.stdout.write("%-14s %13d %8.0f %10.1f %10.1f  %s" % (
+            mode, len(latencies), len(latencies) / elapsed,
+            self.percentile(latencies, 50) * 1000, self.percentile(latencies, 99) * 1000,
+            json.dumps(dict((str(status), statuses.count(status)) for status in set(statuses)), sort_keys=True),
+        ))
+
+    def percentile(self, latencies, percent):
+        # Nearest-rank percentile.
+        return latencies[max(int(round(percent / 100.0 * len(latencies))) - 1, 0)] if latencies else 0.0
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from accounts.api import serializers
+from accounts.models import AuthToken, UserProfile
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark of the fast-path serializers against the DRF serializers
+    they replace, on profiles and tokens from the database.
+
+    Before timing, the rendered JSON of both is compared for every sampled
+    profile and token, and the command fails on any difference.
+
+    """
+
+    help = 'Benchmarks the fast-path serializers and checks they render the same output as the DRF ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', dest='sample', type=int, default=200,
+                            help="Number of profiles / tokens to check and benchmark with.")
+        parser.add_argument('--iterations', dest='iterations', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        row_serializer = serializers.user_profile_row_serializer
+        login_serializer = serializers.user_login_response_serializer
+
+        profiles = list(UserProfile.objects.select_related('user', 'team').order_by('pk')[:options['sample']])
+        rows = dict(
+            (row['id'], row) for row in UserProfile.objects.filter(
+                pk__in=[profile.pk for profile in profiles]
+            ).values('id', *row_serializer.lookups)
+        )
+        tokens = list(AuthToken.objects.order_by('key')[:options['sample']])
+        if not profiles or not tokens:
+            raise CommandError("At least one user profile and one token are needed.")
+
+        mismatches = [
+            profile.user_id for profile in profiles
+            if renderer.render(serializers.UserProfileSerializer(profile).data) !=
+            renderer.render(row_serializer.to_representation(rows[profile.pk]))
+        ]
+        mismatches += [
+            token.user_id for token in tokens
+            if renderer.render(serializers.UserLoginSerializer().to_representation({'token': token})) !=
+            renderer.render(login_serializer.to_representation(token))
+        ]
+        if mismatches:
+            raise CommandError("Output differs for users: %s" % ", ".join(str(pk) for pk in mismatches))
+        self.stdout.write("Output identical for %s profiles and %s tokens." % (len(profiles), len(tokens)))
+
+        iterations = options['iterations']
+        self.compare(
+            'profile', iterations,
+            lambda i: serializers.UserProfileSerializer(profiles[i % len(profiles)]).data,
+            lambda i: row_serializer.to_representation(rows[profiles[i % len(profiles)].pk])
+        )
+        self.compare(
+            'login', iterations,
+            lambda i: serializers.UserLoginSerializer().to_representation({'token': tokens[i % len(tokens)]}),
+            lambda i: login_serializer.to_representation(tokens[i % len(tokens)])
+        )
+
+    def compare(self, name, iterations, drf, fast):
+        timings = []
+        for function in (drf, fast):
+            started = time.time()
+            for i in range(iterations):
+                function(i)
+            timings.append((time.time() - started) * 10 ** 6 / iterations)
+
+        self.stdout.write("%s: drf %.2f us, fast %.2f us (%.1fx)" % (
+            name, timings[0], timings[1], timings[0] / timings[1] if timings[1] else 0
+        ))
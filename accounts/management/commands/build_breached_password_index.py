@@ -0,0 +1,92 @@
+import os
+import heapq
+import hashlib
+import binascii
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.password_validation import DIGEST_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Builds the breached password index used by ``BreachedPasswordValidator``.
+
+    The input is either a list of SHA-1 hashes, one per line, optionally
+    followed by ``:count`` (the Pwned Passwords format), or with ``--plain``,
+    a list of passwords. Digests are sorted in chunks of ``--chunk-size``
+    and merged, so memory usage stays bounded for any corpus size.
+
+    """
+
+    help = 'Builds a sorted, memory-mappable breached password index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File of SHA-1 hashes (or passwords with --plain).")
+        parser.add_argument('output', help="Index file to write.")
+        parser.add_argument('--plain', dest='plain', action='store_true',
+                            help="The input holds plain text passwords.")
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=5000000,
+                            help="Number of digests sorted in memory at a time.")
+
+    def handle(self, *args, **options):
+        chunk_files = []
+        try:
+            with open(options['input'], 'rb') as input_file:
+                chunk = []
+                for line in input_file:
+                    digest = self.parse(line, options['plain'])
+                    if digest is None:
+                        continue
+                    chunk.append(digest)
+                    if len(chunk) >= options['chunk_size']:
+                        chunk_files.append(self.write_chunk(chunk))
+                        chunk = []
+                if chunk:
+                    chunk_files.append(self.write_chunk(chunk))
+
+            count = self.merge(chunk_files, options['output'])
+        finally:
+            for chunk_file in chunk_files:
+                chunk_file.close()
+
+        self.stdout.write("Wrote %s digests to %s." % (count, options['output']))
+
+    def parse(self, line, plain):
+        line = line.rstrip(b'\r\n')
+        if not line:
+            return None
+        if plain:
+            return hashlib.sha1(line).digest()
+        try:
+            return binascii.unhexlify(line.split(b':', 1)[0].strip())
+        except (TypeError, ValueError):
+            raise CommandError("Invalid SHA-1 hash: %r" % line)
+
+    def write_chunk(self, chunk):
+        chunk.sort()
+        chunk_file = tempfile.TemporaryFile()
+        chunk_file.write(b''.join(chunk))
+        chunk_file.seek(0)
+        return chunk_file
+
+    def read_chunk(self, chunk_file):
+        while True:
+            digest = chunk_file.read(DIGEST_SIZE)
+            if len(digest) < DIGEST_SIZE:
+                return
+            yield digest
+
+    def merge(self, chunk_files, output):
+        count = 0
+        previous = None
+        partial = output + '.partial'
+        with open(partial, 'wb') as output_file:
+            for digest in heapq.merge(*[self.read_chunk(chunk_file) for chunk_file in chunk_files]):
+                if digest != previous:
+                    output_file.write(digest)
+                    previous = digest
+                    count += 1
+        os.rename(partial, output)
+        return count
@@ -0,0 +1,94 @@
+import time
+
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, BCryptSHA256PasswordHasher, PBKDF2PasswordHasher
+)
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the password hashers available on this host and recommends
+    the work factor that makes one hash take about ``--target-ms``.
+
+    PBKDF2 cost is linear in iterations, bcrypt cost doubles with every round
+    and argon2 cost is roughly linear in time_cost.
+
+    """
+
+    help = 'Benchmarks password hashers and recommends work factors for a target latency.'
+
+    PASSWORD = 'calibration-password'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', dest='target_ms', type=float, default=250.0)
+        parser.add_argument('--samples', dest='samples', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.samples = options['samples']
+        target = options['target_ms'] / 1000.0
+
+        self.calibrate_pbkdf2(target)
+        self.calibrate_bcrypt(target)
+        self.calibrate_argon2(target)
+
+    def measure(self, encode):
+        """
+        Returns the fastest of ``samples`` runs, in seconds.
+
+        """
+
+        timings = []
+        for _ in range(self.samples):
+            started = time.time()
+            encode()
+            timings.append(time.time() - started)
+        return min(timings)
+
+    def calibrate_pbkdf2(self, target):
+        hasher = PBKDF2PasswordHasher()
+        iterations = 10000
+        elapsed = self.measure(lambda: hasher.encode(self.PASSWORD, hasher.salt(), iterations))
+        recommended = int(iterations * target / elapsed) // 1000 * 1000
+
+        self.stdout.write("PBKDF2 (SHA256): %s iterations take %.1f ms" % (iterations, elapsed * 1000))
+        self.stdout.write("  Recommended: PASSWORD_PBKDF2_ITERATIONS = %s (Django default: %s)" % (
+            recommended, PBKDF2PasswordHasher.iterations
+        ))
+
+    def calibrate_bcrypt(self, target):
+        try:
+            import bcrypt
+        except ImportError:
+            self.stdout.write("bcrypt: not installed, skipped.")
+            return
+
+        rounds = 10
+        elapsed = self.measure(lambda: bcrypt.hashpw(self.PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)))
+        recommended = rounds
+        while elapsed * 2 ** (recommended + 1 - rounds) <= target:
+            recommended += 1
+
+        self.stdout.write("bcrypt: %s rounds take %.1f ms" % (rounds, elapsed * 1000))
+        self.stdout.write("  Recommended: rounds = %s (Django default: %s)" % (
+            recommended, BCryptSHA256PasswordHasher.rounds
+        ))
+
+    def calibrate_argon2(self, target):
+        try:
+            from argon2 import PasswordHasher
+        except ImportError:
+            self.stdout.write("argon2: not installed, skipped.")
+            return
+
+        hasher = Argon2PasswordHasher()
+        argon2_hasher = PasswordHasher(
+            time_cost=hasher.time_cost, memory_cost=hasher.memory_cost, parallelism=hasher.parallelism
+        )
+        elapsed = self.measure(lambda: argon2_hasher.hash(self.PASSWORD))
+        recommended = max(int(hasher.time_cost * target / elapsed), 1)
+
+        self.stdout.write("argon2: time_cost %s (memory_cost %s KiB) takes %.1f ms" % (
+            hasher.time_cost, hasher.memory_cost, elapsed * 1000
+        ))
+        self.stdout.write("  Recommended: time_cost = %s" % recommended)
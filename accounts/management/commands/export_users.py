@@ -0,0 +1,135 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from base import streaming
+from teams.models import Team
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Streams all users along with their profile and team ids.
+
+    Users are read in keyset chunks on the primary key, so memory usage
+    is bounded by ``--chunk-size`` regardless of the table size.
+
+    Formats:
+        csv     - one line per user.
+        ndjson  - one JSON document per line per user.
+        columns - one JSON document per line per chunk, holding a list of
+                  values for every field (column oriented, as in Parquet row groups).
+
+    """
+
+    help = 'Exports users and their profiles as CSV, NDJSON or columnar JSON.'
+
+    FORMATS = ('csv', 'ndjson', 'columns')
+
+    FIELDS = (
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_active',
+        'date_joined', 'last_login', 'has_email_verified',
+        'profile_timestamp_created', 'profile_timestamp_updated', 'team_ids',
+    )
+
+    QUERY_FIELDS = {
+        'has_email_verified': 'userprofile__has_email_verified',
+        'profile_timestamp_created': 'userprofile__timestamp_created',
+        'profile_timestamp_updated': 'userprofile__timestamp_updated',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='format', default='csv', choices=self.FORMATS)
+        parser.add_argument('--output', dest='output', default='-',
+                            help="File to write to. Defaulted to stdout.")
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=2000)
+        parser.add_argument('--progress-every', dest='progress_every', type=int, default=50000,
+                            help="Report progress on stderr every N users. 0 to disable.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size should be a positive integer.")
+
+        output = options['output']
+        if output == '-':
+            stream = self.stdout
+            stream.ending = ''
+        else:
+            stream = open(output, 'w')
+        try:
+            self.export(stream, options)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+
+    def export(self, stream, options):
+        queryset = User.objects.values(
+            *[self.QUERY_FIELDS.get(field, field) for field in self.FIELDS if field != 'team_ids']
+        )
+        chunks = streaming.keyset_chunks(queryset, key='id', chunk_size=options['chunk_size'])
+
+        writer = getattr(self, 'write_%s' % options['format'])
+        started = time.time()
+        total = 0
+        reported = 0
+
+        for index, rows in enumerate(chunks):
+            rows = self.prepare_rows(rows)
+            writer(stream, rows, first=(index == 0))
+            total += len(rows)
+
+            if options['progress_every'] and total - reported >= options['progress_every']:
+                reported = total
+                self.report(total, started)
+
+        self.report(total, started, done=True)
+
+    def prepare_rows(self, rows):
+        """
+        Renames the profile fields and attaches team ids to the given user rows,
+        fetching the memberships of the whole chunk in one query.
+
+        """
+
+        memberships = Team.members.through.objects.filter(
+            user_id__in=[row['id'] for row in rows]
+        ).values_list('user_id', 'team_id')
+
+        team_ids = {}
+        for user_id, team_id in memberships:
+            team_ids.setdefault(user_id, []).append(team_id)
+
+        for row in rows:
+            for field, query_field in self.QUERY_FIELDS.items():
+                row[field] = row.pop(query_field)
+            row['team_ids'] = team_ids.get(row['id'], [])
+        return rows
+
+    def write_csv(self, stream, rows, first):
+        for row in rows:
+            row['team_ids'] = ' '.join(str(team_id) for team_id in row['team_ids'])
+        lines = streaming.csv_lines(rows, self.FIELDS)
+        if not first:
+            next(lines)  # Header only once.
+        for line in lines:
+            stream.write(line)
+
+    def write_ndjson(self, stream, rows, first):
+        for line in streaming.ndjson_lines(rows, self.FIELDS):
+            stream.write(line)
+
+    def write_columns(self, stream, rows, first):
+        columns = dict((field, [row[field] for row in rows]) for field in self.FIELDS)
+        line = json.dumps(columns, cls=DjangoJSONEncoder) + '\n'
+        stream.write(line)
+
+    def report(self, total, started, done=False):
+        elapsed = time.time() - started
+        rate = total / elapsed if elapsed else 0
+        self.stderr.write("%s %s users in %.1fs (%.0f users/s)" % (
+            'Exported' if done else 'Progress:', total, elapsed, rate
+        ))
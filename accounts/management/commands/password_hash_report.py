@@ -0,0 +1,61 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+from django.core.management.base import BaseCommand
+
+from base import streaming
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Reports how many accounts use each password hashing algorithm and work
+    factor, and how many remain on legacy parameters, i.e. will be rehashed
+    on their next login.
+
+    """
+
+    help = 'Reports password hash algorithms and accounts remaining on legacy parameters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        preferred = get_hasher()
+        parameters = Counter()
+        legacy = 0
+        unusable = 0
+        total = 0
+
+        rows = streaming.keyset_iterator(
+            User.objects.values('id', 'password'), key='id', chunk_size=options['chunk_size']
+        )
+        for row in rows:
+            total += 1
+            encoded = row['password']
+            try:
+                hasher = identify_hasher(encoded)
+            except ValueError:
+                unusable += 1
+                continue
+
+            parameters[self.describe(hasher, encoded)] += 1
+            if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+                legacy += 1
+
+        self.stdout.write("Preferred hasher: %s" % preferred.algorithm)
+        for description, count in sorted(parameters.items()):
+            self.stdout.write("  %-40s %s" % (description, count))
+        self.stdout.write("Accounts: %s, on legacy parameters: %s, without usable password: %s" % (
+            total, legacy, unusable
+        ))
+
+    def describe(self, hasher, encoded):
+        summary = hasher.safe_summary(encoded)
+        for name in ('iterations', 'work factor', 'time cost'):
+            for key, value in summary.items():
+                if str(key).lower() == name:
+                    return '%s (%s %s)' % (hasher.algorithm, name, value)
+        return hasher.algorithm
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import AuthToken
+
+
+class Command(BaseCommand):
+    """
+    Deletes the expired API tokens, in chunks.
+
+    """
+
+    help = 'Deletes expired API tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = AuthToken.objects.purge_expired(chunk_size=options['chunk_size'])
+        self.stdout.write("Deleted %s expired tokens." % deleted)
@@ -0,0 +1,333 @@
+import re
+import json
+import time
+import threading
+from collections import deque
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import Resolver404, resolve
+from django.utils.six.moves import http_client, queue, urllib
+
+from base import utils as base_utils
+from accounts.models import UserProfile
+from teams.models import Team, TeamInvitation
+
+User = get_user_model()
+
+VERIFY_RE = re.compile(r'^/api/accounts/verify/(?P<key>[^/]+)/$')
+RESET_RE = re.compile(r'^/api/accounts/reset/(?P<uid>[^/]+)/(?P<token>[^/]+)/$')
+TEAM_RE = re.compile(r'^/api/teams/(?P<pk>[0-9]+)/')
+
+
+class Rewriter(object):
+    """
+    Maps the recorded values of tokens, verification keys, reset links,
+    invite codes and team ids to the ones issued by the server under replay.
+
+    A recorded value is mapped either exactly (when the recorded response
+    carries it, as for login tokens) or to the oldest value issued during
+    the replay that hasn't been mapped yet. Secrets that are delivered by email
+    are read from the database the server under replay writes to.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mapping = {}
+        self.pending = {}
+
+    def resolve(self, kind, recorded):
+        with self.lock:
+            if (kind, recorded) not in self.mapping:
+                pending = self.pending.get(kind)
+                if not pending:
+                    return recorded
+                self.mapping[(kind, recorded)] = pending.popleft()
+            return self.mapping[(kind, recorded)]
+
+    def issue(self, kind, value, recorded=None):
+        with self.lock:
+            if recorded is not None:
+                self.mapping[(kind, recorded)] = value
+            else:
+                self.pending.setdefault(kind, deque()).append(value)
+
+    def user_for_token(self, token):
+        return User.objects.filter(api_token__key=token).first()
+
+    def rewrite(self, entry):
+        """
+        Returns the method, path, body and headers to send for a recorded entry.
+
+        """
+
+        path = entry['path']
+        body = entry.get('body')
+        headers = dict(entry.get('headers') or {})
+
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('Token '):
+            headers['Authorization'] = 'Token ' + self.resolve('token', authorization[6:])
+
+        match = VERIFY_RE.match(path)
+        if match:
+            path = '/api/accounts/verify/%s/' % self.resolve('verification_key', match.group('key'))
+
+        match = RESET_RE.match(path)
+        if match:
+            uid, token = self.resolve('reset', (match.group('uid'), match.group('token')))
+            path = '/api/accounts/reset/%s/%s/' % (uid, token)
+
+        match = TEAM_RE.match(path)
+        if match:
+            path = '/api/teams/%s/%s' % (self.resolve('team', match.group('pk')), path[match.end():])
+
+        if isinstance(body, dict) and body.get('invite_code') and body.get('email'):
+            invitation = TeamInvitation.objects.filter(
+                email=body['email'], status=TeamInvitation.PENDING
+            ).last()
+            if invitation:
+                body = dict(body, invite_code=invitation.code)
+
+        return entry['method'].upper(), path, body, headers
+
+    def learn(self, entry, method, path, body, headers, status, response):
+        """
+        Records the values issued by the server for a replayed request.
+
+        """
+
+        if status >= 400 or method != 'POST':
+            return
+
+        body = body if isinstance(body, dict) else {}
+
+        if path == '/api/accounts/login/' and isinstance(response, dict) and response.get('token'):
+            recorded = entry.get('response')
+            recorded = recorded.get('token') if isinstance(recorded, dict) else None
+            self.issue('token', response['token'], recorded=recorded)
+
+        elif path == '/api/accounts/register/' and body.get('email'):
+            profile = UserProfile.objects.filter(user__email=body['email']).last()
+            if profile:
+                self.issue('verification_key', profile.verification_key)
+
+        elif path == '/api/accounts/password_reset/' and body.get('email'):
+            user = User.objects.filter(email=body['email']).first()
+            if user:
+                self.issue('reset', (
+                    base_utils.base36encode(user.pk), default_token_generator.make_token(user)
+                ))
+
+        elif path == '/api/teams/create/':
+            authorization = headers.get('Authorization', '')
+            user = self.user_for_token(authorization[6:]) if authorization.startswith('Token ') else None
+            team = Team.objects.filter(owner=user).last() if user else None
+            if team:
+                self.issue('team', str(team.pk))
+
+
+class Command(BaseCommand):
+    """
+    Replays recorded API traffic against a running server and reports
+    latency distributions and status codes per endpoint.
+
+    The log holds one JSON document per line:
+
+        {"method": "POST", "path": "/api/accounts/login/", "timestamp": 1494150000.25,
+         "body": {"email": "...", "password": "..."}, "headers": {"Authorization": "Token ..."},
+         "status": 200, "response": {"token": "..."}}
+
+    ``timestamp`` (seconds) is used to keep the original pacing, ``status`` and
+    ``response`` are optional and only used to map tokens. Tokens, verification
+    keys, password reset links, invite codes and team ids are rewritten so that
+    dependent requests chain correctly (see ``Rewriter``). The server under replay
+    must use the same database as this command.
+
+    """
+
+    help = 'Replays recorded API traffic and reports per-endpoint latency and status codes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help="Recorded request log (JSON lines).")
+        parser.add_argument('--base-url', dest='base_url', default='http://127.0.0.1:8000')
+        parser.add_argument('--speed', dest='speed', type=float, default=1.0,
+                            help="Replay rate relative to the recording. 0 to send as fast as possible.")
+        parser.add_argument('--concurrency', dest='concurrency', type=int, default=8)
+        parser.add_argument('--timeout', dest='timeout', type=float, default=30.0)
+        parser.add_argument('--report', dest='report', default=None,
+                            help="File to write the JSON report to, for diffing between builds.")
+        parser.add_argument('--baseline', dest='baseline', default=None,
+                            help="A previous JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency should be a positive integer.")
+
+        url = urllib.parse.urlsplit(options['base_url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError("--base-url should be a http(s) URL.")
+
+        self.url = url
+        self.timeout = options['timeout']
+        self.rewriter = Rewriter()
+        self.results_lock = threading.Lock()
+        self.results = {}
+
+        entries = queue.Queue(maxsize=options['concurrency'] * 2)
+        workers = [threading.Thread(target=self.worker, args=(entries, ))
+                   for _ in range(options['concurrency'])]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        started = time.time()
+        total = self.schedule(options['log'], entries, options['speed'])
+        for _ in workers:
+            entries.put(None)
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - started
+
+        report = self.build_report(total, elapsed)
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                report_file.write(content + '\n')
+        else:
+            self.stdout.write(content)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                self.compare(json.load(baseline_file), report)
+
+    def schedule(self, log, entries, speed):
+        """
+        Queues the recorded entries, keeping their original spacing scaled by ``speed``.
+
+        """
+
+        total = 0
+        first_timestamp = None
+        started = time.time()
+
+        with open(log) as log_file:
+            for line in log_file:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+
+                timestamp = entry.get('timestamp')
+                if speed > 0 and timestamp is not None:
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    delay = (timestamp - first_timestamp) / speed - (time.time() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                entries.put(entry)
+                total += 1
+        return total
+
+    def connect(self):
+        connection_class = http_client.HTTPSConnection if self.url.scheme == 'https' else http_client.HTTPConnection
+        return connection_class(self.url.hostname, self.url.port, timeout=self.timeout)
+
+    def worker(self, entries):
+        connection = self.connect()
+        while True:
+            entry = entries.get()
+            if entry is None:
+                connection.close()
+                return
+
+            method, path, body, headers = self.rewriter.rewrite(entry)
+            payload = None
+            if body is not None:
+                payload = json.dumps(body)
+                headers.setdefault('Content-Type', 'application/json')
+
+            started = time.time()
+            try:
+                connection.request(method, self.url.path.rstrip('/') + path, body=payload, headers=headers)
+                http_response = connection.getresponse()
+                content = http_response.read()
+                status = http_response.status
+            except (http_client.HTTPException, IOError):
+                connection.close()
+                connection = self.connect()
+                content, status = None, 0
+            latency = time.time() - started
+
+            response = None
+            if content:
+                try:
+                    response = json.loads(content.decode('utf-8'))
+                except ValueError:
+                    pass
+
+            self.rewriter.learn(entry, method, path, body, headers, status, response)
+            self.record(self.endpoint(method, path), status, latency)
+
+    def endpoint(self, method, path):
+        try:
+            view = resolve(path).func.__name__
+        except Resolver404:
+            view = 'unresolved'
+        return '%s %s' % (method, view)
+
+    def record(self, endpoint, status, latency):
+        with self.results_lock:
+            result = self.results.setdefault(endpoint, {'latencies': [], 'statuses': {}})
+            result['latencies'].append(latency)
+            result['statuses'][str(status)] = result['statuses'].get(str(status), 0) + 1
+
+    def build_report(self, total, elapsed):
+        endpoints = {}
+        for endpoint, result in self.results.items():
+            latencies = sorted(result['latencies'])
+            count = len(latencies)
+            errors = sum(n for status, n in result['statuses'].items() if not status.startswith('2'))
+            endpoints[endpoint] = {
+                'count': count,
+                'statuses': result['statuses'],
+                'error_rate': round(float(errors) / count, 4),
+                'latency_ms': {
+                    'mean': round(sum(latencies) * 1000 / count, 2),
+                    'p50': self.percentile(latencies, 50),
+                    'p90': self.percentile(latencies, 90),
+                    'p99': self.percentile(latencies, 99),
+                    'max': round(latencies[-1] * 1000, 2),
+                },
+            }
+
+        return {
+            'requests': total,
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+            'endpoints': endpoints,
+        }
+
+    def percentile(self, latencies, percent):
+        # Nearest-rank percentile, in milliseconds.
+        index = max(int(round(percent / 100.0 * len(latencies))) - 1, 0)
+        return round(latencies[index] * 1000, 2)
+
+    def compare(self, baseline, report):
+        self.stdout.write("%-45s %10s %10s %10s %10s" % ('endpoint', 'p50 (ms)', 'p99 (ms)', 'errors', 'requests'))
+        for endpoint in sorted(set(baseline['endpoints']) | set(report['endpoints'])):
+            old = baseline['endpoints'].get(endpoint)
+            new = report['endpoints'].get(endpoint)
+            if not old or not new:
+                self.stdout.write("%-45s %s" % (endpoint, 'only in baseline' if old else 'new'))
+                continue
+            self.stdout.write("%-45s %+10.2f %+10.2f %+10.4f %+10d" % (
+                endpoint,
+                new['latency_ms']['p50'] - old['latency_ms']['p50'],
+                new['latency_ms']['p99'] - old['latency_ms']['p99'],
+                new['error_rate'] - old['error_rate'],
+                new['count'] - old['count'],
+            ))
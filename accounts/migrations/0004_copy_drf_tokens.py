@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def copy_drf_tokens(apps, schema_editor):
+    """
+    Carries the existing rest_framework tokens over to ``AuthToken``,
+    so that clients already logged in stay logged in.
+
+    """
+
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('accounts', 'AuthToken')
+
+    now = timezone.now()
+    AuthToken.objects.bulk_create([
+        AuthToken(key=key, user_id=user_id, last_used=now)
+        for key, user_id in Token.objects.values_list('key', 'user_id').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authtoken', '0002_auto_20160226_1747'),
+        ('accounts', '0003_authtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_drf_tokens, migrations.RunPython.noop),
+    ]
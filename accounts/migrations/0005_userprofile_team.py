@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 03:19
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0003_team_counters'),
+        ('accounts', '0004_copy_drf_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='team',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='member_profiles', to='teams.Team'),
+        ),
+    ]
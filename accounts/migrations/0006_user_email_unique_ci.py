@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+INDEX_NAME = 'accounts_user_email_unique_ci'
+
+# Partial, so that users created without an email address (e.g. with createsuperuser) are not affected.
+CREATE_INDEX_SQL = {
+    'postgresql': 'CREATE UNIQUE INDEX %(name)s ON %(table)s (UPPER(email)) WHERE email <> \'\'',
+    'sqlite': 'CREATE UNIQUE INDEX %(name)s ON %(table)s (UPPER(email)) WHERE email <> \'\'',
+}
+
+
+def create_email_index(apps, schema_editor):
+    """
+    Enforces case-insensitive uniqueness of ``User.email`` at the database level.
+    Backends without expression indexes rely on registration validation alone.
+
+    """
+
+    sql = CREATE_INDEX_SQL.get(schema_editor.connection.vendor)
+    if sql is None:
+        return
+
+    User = apps.get_model('auth', 'User')
+    emails = set()
+    duplicates = set()
+    for email in User.objects.exclude(email='').values_list('email', flat=True).iterator():
+        if email.upper() in emails:
+            duplicates.add(email.lower())
+        emails.add(email.upper())
+    if duplicates:
+        raise RuntimeError(
+            "Email addresses used by more than one user, to be resolved before migrating: %s"
+            % ", ".join(sorted(duplicates))
+        )
+
+    schema_editor.execute(sql % {
+        'name': schema_editor.quote_name(INDEX_NAME),
+        'table': schema_editor.quote_name(User._meta.db_table),
+    })
+
+
+def drop_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX_SQL:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % schema_editor.quote_name(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0008_alter_user_username_max_length'),
+        ('accounts', '0005_userprofile_team'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
@@ -1,4 +1,6 @@
+import os
 import re
+import binascii
 import hashlib
 import datetime
 
@@ -13,6 +15,7 @@ from django.utils import timezone
 from django.contrib.auth.tokens import default_token_generator
 
 from base import utils as base_utils
+from base import invalidation
 from base import models as base_models
 
 User = get_user_model()
@@ -47,41 +50,104 @@ class UserProfileRegistrationManager(models.Manager):
 
     """
 
-    @transaction.atomic
-    def create_user_profile(self, data, is_active=False, site=None, send_email=True):
+    def registration_conflicts(self, email, username):
         """
-        Create a new user and its associated ``UserProfile``.
-        Also, send user account activation (verification) email.
+        Checks the email address (case-insensitively) and username of
+        a registration against existing users, in a single query.
+        Returns the set of field names already taken, among ``email`` and ``username``.
+
+        """
+
+        email = (email or '').lower()
+        conflicts = set()
+        for existing_email, existing_username in User.objects.filter(
+                models.Q(email__iexact=email) | models.Q(username=username)
+        ).values_list('email', 'username'):
+            if email and existing_email.lower() == email:
+                conflicts.add('email')
+            if existing_username == username:
+                conflicts.add('username')
+        return conflicts
+
+    def build_user(self, data, is_active=False):
+        """
+        Returns an unsaved user for given registration data, with its password hashed.
 
         """
 
+        data = dict(data)
         password = data.pop('password')
         user = User(**data)
         user.is_active = is_active
         user.set_password(password)
+        return user
+
+    @transaction.atomic
+    def create_user_profile(self, data, is_active=False, site=None, send_email=True):
+        """
+        Create a new user and its associated ``UserProfile``.
+        Also, send user account activation (verification) email.
+
+        """
+
+        user = self.build_user(data, is_active=is_active)
         user.save()
 
         user_profile = self.create_profile(user)
 
         if send_email:
-            user_profile.send_activation_email(site)  # To be made asynchronous in production
+            user_profile.send_activation_email(site)  # Sent by the dispatch_emails command
 
         return user
 
-    def create_profile(self, user):
+    @transaction.atomic
+    def create_user_profiles(self, users, site=None, send_email=True):
         """
-        Create UserProfile for give user.
-        Returns created user profile on success.
+        Creates given unsaved users (see ``build_user``) and their profiles
+        with ``bulk_create``, and queues their activation emails, in one
+        transaction. No ``post_save`` is sent; the keys of the users are
+        published to the invalidation bus instead. Raises ``IntegrityError`` if any of the users conflicts
+        with an existing one (or another one of the list), creating none.
+        Returns the users.
 
         """
 
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # The backend doesn't return the ids of bulk inserted rows (e.g. SQLite).
+            ids = dict(User.objects.filter(
+                username__in=[user.username for user in users]
+            ).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+
+        profiles = self.bulk_create([
+            self.model(user=user, verification_key=self.make_verification_key(user)) for user in users
+        ])
+
+        if send_email:
+            base_models.OutboxEmail.objects.enqueue_many([profile.get_activation_email(site) for profile in profiles])
+
+        # ``bulk_create`` sends no ``post_save``, which the invalidation bus listens to.
+        invalidation.publish([key for user in users for key in invalidation.keys_for_user(user.pk)])
+
+        return users
+
+    def make_verification_key(self, user):
         username = str(getattr(user, User.USERNAME_FIELD))
         hash_input = (get_random_string(5) + username).encode('utf-8')
-        verification_key = hashlib.sha1(hash_input).hexdigest()
+        return hashlib.sha1(hash_input).hexdigest()
+
+    def create_profile(self, user):
+        """
+        Create UserProfile for give user.
+        Returns created user profile on success.
+
+        """
 
         profile = self.create(
             user=user,
-            verification_key=verification_key
+            verification_key=self.make_verification_key(user)
         )
 
         return profile
@@ -156,6 +222,19 @@ class UserProfile(base_models.TimeStampedModel, Verification):
         max_length=40
     )
 
+    last_activity = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    team = models.ForeignKey(
+        'teams.Team',
+        related_name='member_profiles',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+
     objects = UserProfileRegistrationManager()
 
     class Meta:
@@ -179,9 +258,9 @@ class UserProfile(base_models.TimeStampedModel, Verification):
         return self.verification_key == self.ACTIVATED or \
                (self.user.date_joined + expiration_date <= timezone.now())
 
-    def send_activation_email(self, site):
+    def get_activation_email(self, site):
         """
-        Sends an activation (verification) email to user.
+        Builds the activation (verification) email to user.
         """
 
         context = {
@@ -204,11 +283,18 @@ class UserProfile(base_models.TimeStampedModel, Verification):
 
         msg = EmailMultiAlternatives(subject, "", settings.DEFAULT_FROM_EMAIL, [self.user.email])
         msg.attach_alternative(message, "text/html")
-        msg.send()
+        return msg
 
-    def send_password_reset_email(self, site):
+    def send_activation_email(self, site):
+        """
+        Queues an activation (verification) email to user.
         """
-        Sends a password reset email to user.
+
+        base_models.OutboxEmail.objects.enqueue(self.get_activation_email(site))
+
+    def get_password_reset_email(self, site):
+        """
+        Builds a password reset email to user.
 
         """
 
@@ -232,4 +318,147 @@ class UserProfile(base_models.TimeStampedModel, Verification):
 
         msg = EmailMultiAlternatives(subject, "", settings.DEFAULT_FROM_EMAIL, [self.user.email])
         msg.attach_alternative(message, "text/html")
-        msg.send()
+        return msg
+
+    def send_password_reset_email(self, site):
+        """
+        Queues a password reset email to user.
+
+        """
+
+        base_models.OutboxEmail.objects.enqueue(self.get_password_reset_email(site))
+
+
+class AuthTokenManager(models.Manager):
+    """
+    Custom manager for ``AuthToken`` model.
+
+    The methods defined here provide shortcuts for issuing, rotating
+    and purging expired tokens.
+
+    """
+
+    def issue(self, user):
+        """
+        Returns the user's token, replacing it with a fresh one if expired.
+
+        """
+
+        token, created = self.get_or_create(user=user)
+        if not created and token.is_expired():
+            token = self.rotate(user)
+        return token
+
+    def rotate(self, user):
+        """
+        Replaces the user's token (if any) with a new one.
+        Returns the new token.
+
+        """
+
+        with transaction.atomic():
+            self.filter(user=user).delete()
+            return self.create(user=user)
+
+    def expired(self):
+        """
+        Returns the list of expired tokens.
+
+        """
+
+        return self.filter(last_used__lt=timezone.now() - AuthToken.get_expiry())
+
+    def purge_expired(self, chunk_size=1000):
+        """
+        Deletes expired tokens in chunks of ``chunk_size``, keeping every
+        delete (and the locks it holds) short.
+        Returns the number of tokens deleted.
+
+        """
+
+        deleted = 0
+        while True:
+            keys = list(self.expired().values_list('key', flat=True)[:chunk_size])
+            if not keys:
+                return deleted
+            self.filter(key__in=keys).delete()
+            deleted += len(keys)
+
+
+class AuthToken(models.Model):
+    """
+    An API authentication token with sliding expiry.
+
+    A token expires ``TOKEN_EXPIRY_SECONDS`` after its last use. ``last_used``
+    is written at most once per ``TOKEN_TOUCH_INTERVAL_SECONDS``, so that
+    authenticated reads don't turn into writes.
+
+    """
+
+    key = models.CharField(
+        max_length=40,
+        primary_key=True
+    )
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        related_name='api_token',
+        on_delete=models.CASCADE
+    )
+
+    created = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    last_used = models.DateTimeField(
+        default=timezone.now,
+        db_index=True
+    )
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        verbose_name = u'auth token'
+        verbose_name_plural = u'auth tokens'
+
+    def __str__(self):
+        return self.key
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        return super(AuthToken, self).save(*args, **kwargs)
+
+    @staticmethod
+    def generate_key():
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    @staticmethod
+    def get_expiry():
+        return datetime.timedelta(
+            seconds=getattr(settings, 'TOKEN_EXPIRY_SECONDS', 14 * 24 * 60 * 60)
+        )
+
+    def is_expired(self):
+        """
+        Returns ``True`` if the token hasn't been used within the expiry period,
+        otherwise ``False``.
+
+        """
+
+        return self.last_used + self.get_expiry() <= timezone.now()
+
+    def touch(self):
+        """
+        Extends the expiry of the token, unless it was already extended
+        within ``TOKEN_TOUCH_INTERVAL_SECONDS``.
+
+        """
+
+        now = timezone.now()
+        interval = datetime.timedelta(
+            seconds=getattr(settings, 'TOKEN_TOUCH_INTERVAL_SECONDS', 5 * 60)
+        )
+        if self.last_used + interval <= now:
+            AuthToken.objects.filter(pk=self.pk).update(last_used=now)
+            self.last_used = now
@@ -0,0 +1,92 @@
+import os
+import mmap
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+
+DIGEST_SIZE = 20
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class BreachedPasswordIndex(object):
+    """
+    A sorted file of raw SHA-1 digests (20 bytes each, no separators),
+    memory-mapped read-only so that every worker process shares the same
+    pages through the OS page cache instead of loading it into its heap.
+    Lookups are a binary search, touching about log2(n) records.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as index_file:
+            size = os.fstat(index_file.fileno()).st_size
+            if size % DIGEST_SIZE:
+                raise ImproperlyConfigured("%s is not a breached password index." % path)
+            self.count = size // DIGEST_SIZE
+            self.data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, password):
+        return self.contains_digest(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def contains_digest(self, digest):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = self.data[middle * DIGEST_SIZE:(middle + 1) * DIGEST_SIZE]
+            if record < digest:
+                low = middle + 1
+            elif record > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+
+def get_index(path):
+    """
+    Returns the index for given path, opened once per process.
+
+    """
+
+    with _indexes_lock:
+        if path not in _indexes:
+            if not os.path.exists(path):
+                raise ImproperlyConfigured("Breached password index %s does not exist." % path)
+            _indexes[path] = BreachedPasswordIndex(path)
+        return _indexes[path]
+
+
+class BreachedPasswordValidator(object):
+    """
+    Validate whether the password appears in a breached password corpus,
+    built with the ``build_breached_password_index`` command.
+
+    The index path is taken from the ``index_path`` option or the
+    ``BREACHED_PASSWORDS_INDEX`` setting; without either, no check is done.
+
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+
+    def get_index_path(self):
+        return self.index_path or getattr(settings, 'BREACHED_PASSWORDS_INDEX', None)
+
+    def validate(self, password, user=None):
+        index_path = self.get_index_path()
+        if index_path and password in get_index(index_path):
+            raise ValidationError(
+                "This password has appeared in a data breach. Please choose a different one.",
+                code='password_breached',
+            )
+
+    def get_help_text(self):
+        return "Your password can't be one that has appeared in a data breach."
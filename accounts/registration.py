@@ -0,0 +1,147 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from accounts.models import UserProfile
+from teams.models import TeamInvitation
+
+logger = logging.getLogger(__name__)
+
+
+class PendingRegistration(object):
+
+    def __init__(self, user, site):
+        self.user = user
+        self.site = site
+        self.error = None
+        self.done = threading.Event()
+
+
+class RegistrationBatch(object):
+
+    def __init__(self):
+        self.registrations = []
+        self.full = threading.Event()
+
+
+class RegistrationBatcher(object):
+    """
+    Group commit of registrations.
+
+    Users (built, with their password already hashed, by the request thread)
+    are handed to ``create``, which collects the registrations of concurrent
+    requests into a batch. The first request of a batch leads it: it waits
+    until the batch holds ``REGISTRATION_BATCH_MAX_SIZE`` registrations or
+    ``REGISTRATION_BATCH_MAX_DELAY_MS`` have passed, then inserts the users,
+    their profiles and activation emails with ``bulk_create`` and declines
+    the pending invitations of their emails, in one transaction, on behalf
+    of every request in the batch.
+
+    If the batch conflicts (an email or username taken since validation,
+    or twice in the batch), its registrations are retried one by one, each
+    in its own savepoint of a single transaction, so that only the conflicting
+    ones fail: their requests get the ``IntegrityError``, as without batching.
+
+    Registrations wait for at most one delay; a request thread never returns
+    before its user is committed.
+
+    A batch only groups the registrations in flight at once, which
+    ``ConcurrencyLimitMiddleware`` caps: its default registration limit is
+    raised to ``REGISTRATION_BATCH_MAX_SIZE`` in this mode, explicit
+    ``CONCURRENCY_LIMITS`` should allow as much. A leader always waits the
+    full delay unless the batch fills up, holding its permit meanwhile.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batch = None
+
+    def get_max_size(self):
+        return getattr(settings, 'REGISTRATION_BATCH_MAX_SIZE', 100)
+
+    def get_max_delay(self):
+        return getattr(settings, 'REGISTRATION_BATCH_MAX_DELAY_MS', 5) / 1000.0
+
+    def create(self, user, site=None):
+        """
+        Creates given unsaved user with its profile as part of a batch.
+        Returns the user, or raises the error of its insert.
+
+        """
+
+        registration = PendingRegistration(user, site)
+        with self.lock:
+            batch = self.batch
+            leader = batch is None
+            if leader:
+                batch = self.batch = RegistrationBatch()
+            batch.registrations.append(registration)
+            if len(batch.registrations) >= self.get_max_size():
+                # Closed: later registrations start a new batch.
+                self.batch = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.get_max_delay())
+            with self.lock:
+                if self.batch is batch:
+                    self.batch = None
+            self.commit(batch.registrations)
+        else:
+            registration.done.wait()
+
+        if registration.error is not None:
+            raise registration.error
+        return registration.user
+
+    def commit(self, registrations):
+        try:
+            try:
+                self.insert(registrations)
+            except IntegrityError:
+                self.insert_one_by_one(registrations)
+        except Exception as e:
+            logger.exception("Failed to commit a batch of %s registrations.", len(registrations))
+            for registration in registrations:
+                registration.error = registration.error or e
+        finally:
+            for registration in registrations:
+                registration.done.set()
+
+    def insert(self, registrations):
+        # Grouped by site, for the activation emails; a ``RequestSite`` is built per request.
+        by_site = {}
+        for registration in registrations:
+            site = registration.site
+            key = (site.domain, site.name) if site is not None else None
+            by_site.setdefault(key, (site, []))[1].append(registration.user)
+        with transaction.atomic():
+            for site, users in by_site.values():
+                UserProfile.objects.create_user_profiles(users, site=site)
+            TeamInvitation.objects.decline_pending_invitations(
+                email_ids=[registration.user.email for registration in registrations]
+            )
+
+    def insert_one_by_one(self, registrations):
+        with transaction.atomic():
+            for registration in registrations:
+                # Possibly set by the rolled back bulk insert.
+                registration.user.pk = None
+                try:
+                    with transaction.atomic():
+                        UserProfile.objects.create_user_profiles([registration.user], site=registration.site)
+                except IntegrityError as e:
+                    registration.error = e
+            TeamInvitation.objects.decline_pending_invitations(email_ids=[
+                registration.user.email for registration in registrations if registration.error is None
+            ])
+
+
+batcher = RegistrationBatcher()
+
+
+def group_commit_enabled():
+    return getattr(settings, 'REGISTRATION_GROUP_COMMIT', False)
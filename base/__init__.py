@@ -1 +1,3 @@
 __author__ = 'askar'
+
+default_app_config = 'base.apps.BaseConfig'
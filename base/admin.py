@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import OutboxEmail
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+
+    list_display = ('id', 'subject', 'to', 'status', 'attempts', 'timestamp_created', 'sent_at')
+    list_filter = ('status', )
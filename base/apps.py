@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class BaseConfig(AppConfig):
+
+    name = 'base'
+
+    def ready(self):
+        from . import invalidation, querylog
+        invalidation.connect_signals()
+        querylog.install()
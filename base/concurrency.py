@@ -0,0 +1,199 @@
+"""
+Per-endpoint concurrency limits and load shedding.
+
+Password hashing (registration, login) and sending mail (invitations) make a
+few endpoints orders of magnitude more expensive than the others. Under a
+burst they occupy every worker thread and cheap endpoints (email verification,
+profile) queue up behind them. ``ConcurrencyLimitMiddleware`` caps the number
+of requests in flight per expensive view; requests over the limit wait up to
+``queue_timeout`` seconds for a slot (in a queue of at most ``max_queue``) and
+are otherwise answered right away with ``503 Service Unavailable`` and a
+``Retry-After`` header, leaving the remaining threads to the cheap endpoints.
+
+Limits are adaptive: every ``window`` requests, the limit of a view is scaled
+by the ratio of its long-term latency to the latency of the window, so that it
+shrinks as latency rises (the view is saturating the CPU or a downstream
+service) and grows back, up to the configured ``limit``, as latency recovers.
+
+Limits are per process; they are meant for threaded workers (e.g. gunicorn
+``--threads``), where one process serves several requests at once.
+
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from base.utils import get_view_name
+
+DEFAULT_CONCURRENCY_LIMITS = {
+    'accounts.api.views.UserRegistrationAPIView': {'limit': 4},  # See ``get_limits``.
+    'accounts.api.views.UserLoginAPIView': {'limit': 4},
+    'teams.api.views.InviteToTeamAPIView': {'limit': 2},
+    'teams.api.views.BulkInviteToTeamAPIView': {'limit': 1},
+}
+
+# Latency may rise by this factor over the long-term latency before the limit is reduced.
+TOLERANCE = 1.5
+
+# Weight of a new window in the long-term latency, and of a new limit in the current one.
+LONG_TERM_WEIGHT = 0.05
+SMOOTHING = 0.2
+
+
+REGISTRATION_VIEW = 'accounts.api.views.UserRegistrationAPIView'
+
+
+def get_limits():
+    """
+    Returns ``CONCURRENCY_LIMITS``, or the default limits. With the default
+    limits and ``REGISTRATION_GROUP_COMMIT`` on, registrations may be in flight
+    (and queued) up to ``REGISTRATION_BATCH_MAX_SIZE``, since a batch can only
+    group the registrations in flight at once. Explicit limits are used as is.
+
+    """
+
+    limits = getattr(settings, 'CONCURRENCY_LIMITS', None)
+    if limits is not None:
+        return limits
+
+    limits = dict(DEFAULT_CONCURRENCY_LIMITS)
+    if getattr(settings, 'REGISTRATION_GROUP_COMMIT', False):
+        batch_size = getattr(settings, 'REGISTRATION_BATCH_MAX_SIZE', 100)
+        limits[REGISTRATION_VIEW] = {'limit': batch_size, 'max_queue': batch_size}
+    return limits
+
+
+class ConcurrencyLimiter(object):
+    """
+    A semaphore with a bounded wait queue and an adaptive number of permits.
+
+    """
+
+    def __init__(self, limit, min_limit=1, queue_timeout=0.5, max_queue=None, adaptive=True, window=20):
+        self.max_limit = limit
+        self.min_limit = min(min_limit, limit)
+        self.limit = float(limit)
+        self.queue_timeout = queue_timeout
+        self.max_queue = limit if max_queue is None else max_queue
+        self.adaptive = adaptive
+        self.window = window
+
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.samples = []
+        self.long_term_latency = None
+
+    def acquire(self):
+        """
+        Takes a permit, waiting up to ``queue_timeout`` seconds for one.
+        Returns whether a permit was taken.
+
+        """
+
+        with self.condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.max_queue or not self.queue_timeout:
+                self.rejected += 1
+                return False
+
+            deadline = time.time() + self.queue_timeout
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self.condition.wait(remaining)
+                self.in_flight += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency):
+        with self.condition:
+            self.in_flight -= 1
+            if self.adaptive:
+                self.samples.append(latency)
+                if len(self.samples) >= self.window:
+                    self.adjust(sum(self.samples) / len(self.samples))
+                    self.samples = []
+            self.condition.notify()
+
+    def adjust(self, latency):
+        """
+        Scales the limit down by the ratio of the long-term to the recent
+        latency when latency rose, down to ``min_limit``; otherwise grows it
+        by ``sqrt(limit)``, up to ``limit``.
+
+        """
+
+        if self.long_term_latency is None:
+            self.long_term_latency = latency
+        gradient = max(0.5, min(1.0, TOLERANCE * self.long_term_latency / latency)) if latency else 1.0
+        if gradient < 1.0:
+            new_limit = self.limit * gradient
+        else:
+            new_limit = self.limit + math.sqrt(self.limit)
+        self.limit = max(self.min_limit, min(self.max_limit, (1 - SMOOTHING) * self.limit + SMOOTHING * new_limit))
+        self.long_term_latency = (1 - LONG_TERM_WEIGHT) * self.long_term_latency + LONG_TERM_WEIGHT * latency
+        if self.long_term_latency > latency * 2:
+            # Recovered from a long period of high latency; forget it.
+            self.long_term_latency = latency
+
+    def stats(self):
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+            }
+
+
+class ConcurrencyLimitMiddleware(object):
+    """
+    Applies the limits of ``CONCURRENCY_LIMITS``, a mapping of view paths
+    (as in ``DEFAULT_CONCURRENCY_LIMITS``) to ``ConcurrencyLimiter`` arguments.
+    Requests shed are answered with 503 and ``Retry-After:
+    CONCURRENCY_RETRY_AFTER_SECONDS``.
+
+    """
+
+    def __init__(self, get_response):
+        limits = get_limits()
+        if not limits:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limiters = dict((view, ConcurrencyLimiter(**config)) for view, config in limits.items())
+        self.retry_after = getattr(settings, 'CONCURRENCY_RETRY_AFTER_SECONDS', 1)
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            acquired = getattr(request, 'concurrency_limiter', None)
+            if acquired is not None:
+                limiter, started = acquired
+                limiter.release(time.time() - started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        limiter = self.limiters.get(get_view_name(view_func))
+        if limiter is None:
+            return None
+
+        if not limiter.acquire():
+            response = JsonResponse({'detail': "The server is over capacity, please retry later."}, status=503)
+            response['Retry-After'] = str(self.retry_after)
+            return response
+        request.concurrency_limiter = (limiter, time.time())
+        return None
@@ -0,0 +1,117 @@
+import re
+import json
+import time
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+POLL_SECONDS = 0.05
+
+# Keys of response data never stored in the cache (see ``sanitize``).
+SENSITIVE_KEY_RE = re.compile(r'password|secret|token|key', re.IGNORECASE)
+
+
+def idempotent(handler):
+    """
+    Makes an API view handler idempotent for requests carrying an
+    ``Idempotency-Key`` header.
+
+    The first response for a key (scoped to the view and the user) is kept in
+    the cache for ``IDEMPOTENCY_KEY_TTL_SECONDS``, without credentials (see
+    ``sanitize``), and replayed for retries
+    without running the handler again. Concurrent requests with the same key
+    are single-flighted: one runs, the others wait for its response.
+    Reusing a key with a different payload is rejected.
+
+    """
+
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+
+        cache_key = get_cache_key(view, request, key)
+        lock_key = cache_key + ':lock'
+        fingerprint = get_fingerprint(request, kwargs)
+        lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT_SECONDS', 30)
+        deadline = time.time() + lock_timeout
+
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return replay(stored, fingerprint)
+
+            if cache.add(lock_key, True, lock_timeout):
+                break
+
+            if time.time() >= deadline:
+                return Response(
+                    {'detail': "A request with this Idempotency-Key is in progress."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(POLL_SECONDS)
+
+        try:
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': sanitize(response.data),
+                }, getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60))
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
+
+
+def get_cache_key(view, request, key):
+    user_id = request.user.pk if request.user and request.user.is_authenticated else ''
+    raw = '%s:%s:%s' % (view.__class__.__name__, user_id, key)
+    return 'idempotency:%s' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_fingerprint(request, kwargs):
+    # Keyed, so that the payload (which may hold a password) can't be brute-forced from the cache.
+    raw = '%s:%s' % (
+        json.dumps(request.data, sort_keys=True, default=str),
+        json.dumps(kwargs, sort_keys=True)
+    )
+    return salted_hmac('base.idempotency.get_fingerprint', raw).hexdigest()
+
+
+def sanitize(data):
+    """
+    Returns a copy of response data without the values of credential-like
+    keys (passwords, tokens, secrets, keys), to be kept in the shared cache.
+
+    """
+
+    if isinstance(data, dict):
+        return dict(
+            (key, sanitize(value)) for key, value in data.items()
+            if not SENSITIVE_KEY_RE.search(str(key))
+        )
+    if isinstance(data, (list, tuple)):
+        return [sanitize(value) for value in data]
+    return data
+
+
+def replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': "Idempotency-Key was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
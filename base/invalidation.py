@@ -0,0 +1,389 @@
+"""
+Invalidation of in-process caches across workers and hosts.
+
+Values cached with ``LocalCache`` are evicted in every worker when the rows
+they were built from change: post_save / post_delete / m2m_changed signals of
+``User``, ``UserProfile``, ``Team`` and ``TeamInvitation`` publish the affected
+keys over the configured transport, and every worker listening on it evicts them.
+
+Transports (``INVALIDATION_TRANSPORT``):
+    base.invalidation.LocalTransport         - single process, the stand-in used by default.
+    base.invalidation.UDPMulticastTransport  - every worker on every host joined to a multicast group.
+    base.invalidation.RedisTransport         - Redis pub/sub (needs the ``redis`` package).
+
+Messages may be lost (UDP) or delayed, so every cached value also expires after
+``INVALIDATION_MAX_STALENESS_SECONDS``, which bounds staleness in all cases.
+
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+_caches = []
+_caches_lock = threading.Lock()
+_transport = None
+_transport_lock = threading.Lock()
+
+# Identifies the messages of this process, to skip its own. Set by ``get_transport`` in
+# every process, so that workers forked from a preloaded master each get their own.
+NODE_ID = None
+
+
+def get_max_staleness():
+    return getattr(settings, 'INVALIDATION_MAX_STALENESS_SECONDS', 30)
+
+
+class LocalCache(object):
+    """
+    An in-process cache evicted through the invalidation bus.
+    Holds at most ``max_entries`` values, each for at most
+    ``INVALIDATION_MAX_STALENESS_SECONDS``.
+
+    """
+
+    def __init__(self, name, max_entries=10000):
+        self.name = name
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def get(self, key, default=None):
+        # A worker only reading from its caches must be listening too.
+        get_transport()
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.time():
+                del self.values[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        get_transport()
+        with self.lock:
+            if key not in self.values and len(self.values) >= self.max_entries:
+                # Making room by dropping everything keeps the bound without tracking usage.
+                self.values.clear()
+            self.values[key] = (value, time.time() + get_max_staleness())
+
+    def get_or_set(self, key, default):
+        value = self.get(key)
+        if value is None:
+            value = default()
+            self.set(key, value)
+        return value
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.values.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+def local_cache(name, max_entries=10000):
+    """
+    Creates an in-process cache registered with the invalidation bus,
+    and makes sure this worker is listening on the bus.
+
+    """
+
+    cache = LocalCache(name, max_entries=max_entries)
+    with _caches_lock:
+        _caches.append(cache)
+    get_transport()
+    return cache
+
+
+def evict(keys):
+    """
+    Evicts given keys from every local cache of this worker.
+    The key ``*`` clears the caches entirely.
+
+    """
+
+    with _caches_lock:
+        caches = list(_caches)
+    for cache in caches:
+        if '*' in keys:
+            cache.clear()
+        else:
+            cache.delete_many(keys)
+
+
+def publish(keys):
+    """
+    Evicts given keys in this worker right away, and in every worker once
+    the current transaction (if any) commits.
+
+    """
+
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    evict(keys)
+    transaction.on_commit(lambda: get_transport().publish(keys))
+
+
+_probes = {}
+
+
+def receive(message):
+    """
+    Handles a message from the transport.
+
+    """
+
+    try:
+        data = json.loads(message.decode('utf-8') if isinstance(message, bytes) else message)
+    except ValueError:
+        return
+    if data.get('origin') != NODE_ID:
+        evict(data.get('keys', []))
+    for callback in _probes.pop(data.get('probe'), []):
+        callback()
+
+
+def encode(keys, probe=None):
+    return json.dumps({'origin': NODE_ID, 'keys': keys, 'probe': probe}).encode('utf-8')
+
+
+def probe(timeout=5.0):
+    """
+    Publishes a probe message and waits for this worker to receive it back.
+    Returns the round-trip time in seconds, or ``None`` if it never arrived.
+
+    """
+
+    probe_id = uuid.uuid4().hex
+    received = threading.Event()
+    _probes[probe_id] = [received.set]
+
+    started = time.time()
+    get_transport().send(encode([], probe=probe_id))
+    if not received.wait(timeout):
+        _probes.pop(probe_id, None)
+        return None
+    return time.time() - started
+
+
+class Transport(object):
+    """
+    Base class for invalidation transports.
+    Subclasses implement ``send`` and ``listen``.
+
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    def publish(self, keys):
+        self.send(encode(keys))
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def listen(self):
+        """
+        Starts delivering incoming messages to ``receive``.
+
+        """
+
+        raise NotImplementedError
+
+    def start_thread(self, target):
+        thread = threading.Thread(target=target, name='invalidation-%s' % self.__class__.__name__)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+class LocalTransport(Transport):
+    """
+    Delivers messages within the process only.
+
+    """
+
+    def send(self, message):
+        receive(message)
+
+    def listen(self):
+        pass
+
+
+class UDPMulticastTransport(Transport):
+    """
+    Delivers messages to every worker joined to a multicast group,
+    on this host and on any host reachable from ``interface``.
+
+    Options: ``group`` (239.255.42.99), ``port`` (45999),
+    ``interface`` (127.0.0.1, use the host address to span hosts), ``ttl`` (1).
+
+    """
+
+    def __init__(self, **options):
+        super(UDPMulticastTransport, self).__init__(**options)
+        self.group = options.get('group', '239.255.42.99')
+        self.port = options.get('port', 45999)
+        self.interface = options.get('interface', '127.0.0.1')
+
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, options.get('ttl', 1))
+        self.sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self.sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+    def send(self, message):
+        self.sender.sendto(message, (self.group, self.port))
+
+    def listen(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        receiver.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        receiver.bind(('', self.port))
+        receiver.setsockopt(
+            socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+            struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton(self.interface))
+        )
+
+        def run():
+            while True:
+                receive(receiver.recv(65535))
+
+        self.start_thread(run)
+
+
+class RedisTransport(Transport):
+    """
+    Delivers messages over Redis pub/sub.
+
+    Options: ``url`` (redis://localhost:6379/0), ``channel`` (invalidation).
+
+    """
+
+    def __init__(self, **options):
+        super(RedisTransport, self).__init__(**options)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisTransport requires the redis package.")
+        self.client = redis.StrictRedis.from_url(options.get('url', 'redis://localhost:6379/0'))
+        self.channel = options.get('channel', 'invalidation')
+
+    def send(self, message):
+        self.client.publish(self.channel, message)
+
+    def listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        def run():
+            for message in pubsub.listen():
+                receive(message['data'])
+
+        self.start_thread(run)
+
+
+def get_transport():
+    """
+    Returns the transport of this worker, creating it and starting
+    to listen on first use in the process (i.e. after the worker has been
+    forked), with a new ``NODE_ID``.
+
+    """
+
+    global _transport, NODE_ID
+
+    transport = _transport
+    if transport is not None and transport.pid == os.getpid():
+        return transport
+
+    with _transport_lock:
+        if _transport is None or _transport.pid != os.getpid():
+            NODE_ID = uuid.uuid4().hex
+            transport_class = import_string(
+                getattr(settings, 'INVALIDATION_TRANSPORT', 'base.invalidation.LocalTransport')
+            )
+            transport = transport_class(**getattr(settings, 'INVALIDATION_OPTIONS', {}))
+            transport.pid = os.getpid()
+            transport.listen()
+            _transport = transport
+        return _transport
+
+
+def keys_for_user(user_id):
+    return ['user:%s' % user_id, 'userprofile:%s' % user_id, 'user_teams:%s' % user_id]
+
+
+def keys_for_team(team_id):
+    return ['team:%s' % team_id, 'team_members:%s' % team_id]
+
+
+def on_user_change(sender, instance, **kwargs):
+    publish(keys_for_user(instance.pk))
+
+
+def on_userprofile_change(sender, instance, **kwargs):
+    publish(keys_for_user(instance.user_id))
+
+
+def on_team_change(sender, instance, **kwargs):
+    publish(keys_for_team(instance.pk))
+
+
+def on_team_members_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    # ``instance`` is a team (team.members.add) or a user (user.team.add),
+    # ``pk_set`` holds the pks on the other side, or None on clear.
+    if reverse:
+        team_ids, user_ids = pk_set or [], [instance.pk]
+    else:
+        team_ids, user_ids = [instance.pk], pk_set or []
+
+    keys = []
+    for team_id in team_ids:
+        keys.extend(keys_for_team(team_id))
+    for user_id in user_ids:
+        keys.extend(keys_for_user(user_id))
+    if action == 'post_clear':
+        # The other side isn't known on clear, so drop the caches entirely.
+        keys.append('*')
+    publish(keys)
+
+
+def on_invitation_change(sender, instance, **kwargs):
+    publish(['invitation:%s' % instance.pk, 'invitation_email:%s' % instance.email.lower()])
+
+
+def connect_signals():
+    from django.contrib.auth import get_user_model
+    from django.db.models.signals import post_save, post_delete, m2m_changed
+
+    from accounts.models import UserProfile
+    from teams.models import Team, TeamInvitation
+
+    for model, handler in (
+        (get_user_model(), on_user_change),
+        (UserProfile, on_userprofile_change),
+        (Team, on_team_change),
+        (TeamInvitation, on_invitation_change),
+    ):
+        post_save.connect(handler, sender=model, dispatch_uid='invalidation_save_%s' % model._meta.label_lower)
+        post_delete.connect(handler, sender=model, dispatch_uid='invalidation_delete_%s' % model._meta.label_lower)
+
+    m2m_changed.connect(on_team_members_change, sender=Team.members.through,
+                        dispatch_uid='invalidation_team_members')
@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter per settings module, so that imports and app loading are cold.
+WORKER_SCRIPT = '''
+import io
+import json
+import sys
+import time
+
+started = time.time()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+startup = time.time() - started
+
+path, authorization, requests = sys.argv[1], sys.argv[2], int(sys.argv[3])
+statuses = []
+
+
+def start_response(status, headers, exc_info=None):
+    statuses.append(status.split(' ', 1)[0])
+
+
+def request():
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    if authorization:
+        environ['HTTP_AUTHORIZATION'] = authorization
+    started = time.time()
+    response = application(environ, start_response)
+    for _ in response:
+        pass
+    if hasattr(response, 'close'):
+        response.close()
+    return time.time() - started
+
+first_request = request()
+latencies = sorted(request() for _ in range(requests))
+
+from django.conf import settings
+json.dump({
+    'startup': startup,
+    'first_request': first_request,
+    'latencies': latencies,
+    'statuses': sorted(set(statuses)),
+    'apps': len(settings.INSTALLED_APPS),
+    'middleware': len(settings.MIDDLEWARE),
+    'modules': len(sys.modules),
+}, sys.stdout)
+'''
+
+
+class Command(BaseCommand):
+    """
+    Compares settings profiles (by default the full ``i2x_demo.settings`` and
+    the API-only ``i2x_demo.settings_api``) on cold start and steady-state
+    per-request overhead.
+
+    Every run starts a fresh interpreter that loads the WSGI application
+    (startup), serves one request (first request, which imports the URLconf
+    and views) and then ``--requests`` more (steady state). The default path
+    answers 401 without touching the database, so the figures are those of
+    app loading, middleware, routing and authentication; pass ``--authorization``
+    to measure an authenticated request instead.
+
+    """
+
+    help = 'Benchmarks startup time and per-request overhead of settings profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-modules', dest='settings_modules', nargs='+',
+                            default=['i2x_demo.settings', 'i2x_demo.settings_api'])
+        parser.add_argument('--path', dest='path', default='/api/accounts/user-profile/')
+        parser.add_argument('--authorization', dest='authorization', default='',
+                            help="Authorization header to send, e.g. 'Token <key>'.")
+        parser.add_argument('--runs', dest='runs', type=int, default=5,
+                            help="Fresh interpreters started per settings module.")
+        parser.add_argument('--requests', dest='requests', type=int, default=2000,
+                            help="Steady-state requests served per run.")
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1 or options['requests'] < 1:
+            raise CommandError("--runs and --requests should be positive integers.")
+
+        self.stdout.write("%-28s %5s %5s %8s %12s %14s %10s %10s %s" % (
+            'settings', 'apps', 'mw', 'modules', 'startup (ms)', 'first req (ms)', 'p50 (us)', 'p99 (us)', 'statuses'
+        ))
+        for settings_module in options['settings_modules']:
+            runs = [self.run(settings_module, options) for _ in range(options['runs'])]
+            latencies = sorted(latency for run in runs for latency in run['latencies'])
+            self.stdout.write("%-28s %5s %5s %8s %12.1f %14.1f %10.1f %10.1f %s" % (
+                settings_module, runs[0]['apps'], runs[0]['middleware'], runs[0]['modules'],
+                self.median([run['startup'] for run in runs]) * 1000,
+                self.median([run['first_request'] for run in runs]) * 1000,
+                self.percentile(latencies, 50) * 10 ** 6,
+                self.percentile(latencies, 99) * 10 ** 6,
+                ','.join(sorted(set(status for run in runs for status in run['statuses']))),
+            ))
+
+    def run(self, settings_module, options):
+        environ = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+        process = subprocess.Popen(
+            [sys.executable, '-c', WORKER_SCRIPT, options['path'], options['authorization'], str(options['requests'])],
+            cwd=settings.BASE_DIR, env=environ, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        output, errors = process.communicate()
+        if process.returncode:
+            raise CommandError("%s failed:\n%s" % (settings_module, errors.decode('utf-8', 'replace')))
+        return json.loads(output.decode('utf-8'))
+
+    def median(self, values):
+        return self.percentile(sorted(values), 50)
+
+    def percentile(self, values, percent):
+        # Nearest-rank percentile of sorted values.
+        return values[max(int(round(percent / 100.0 * len(values))) - 1, 0)]
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base import invalidation
+
+# Runs in a separate process: caches a key, then reports when it gets evicted by a message from this one.
+PEER_SCRIPT = '''
+import sys
+import time
+
+import django
+django.setup()
+
+from base import invalidation
+
+key, timeout = sys.argv[1], float(sys.argv[2])
+cache = invalidation.local_cache('check_invalidation_peer')
+cache.set(key, True)
+sys.stdout.write('ready\\n')
+sys.stdout.flush()
+
+deadline = time.time() + timeout
+while time.time() < deadline:
+    # Looked up without ``get``, which would also drop the key once expired.
+    with cache.lock:
+        cached = key in cache.values
+    if not cached:
+        sys.stdout.write('evicted %r\\n' % time.time())
+        sys.stdout.flush()
+        sys.exit(0)
+    time.sleep(0.001)
+sys.stdout.write('timeout\\n')
+sys.exit(1)
+'''
+
+PUBLISH_INTERVAL = 0.1
+
+
+class Command(BaseCommand):
+    """
+    Checks that the configured invalidation transport delivers messages,
+    and reports the observed delivery time along with the staleness bound.
+
+    Probes travel the same way as invalidations sent by other workers
+    (e.g. through the multicast group or the Redis channel), so the slowest
+    probe is the staleness to expect when no message is lost.
+
+    Then a second process is started, which caches a key and waits for this
+    one to invalidate it: the check fails unless the key is evicted there
+    before ``INVALIDATION_MAX_STALENESS_SECONDS``, i.e. by a message rather
+    than by expiry. Skipped with ``LocalTransport``, which stays in-process.
+
+    """
+
+    help = 'Checks the cache invalidation bus and reports its staleness bound.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--probes', dest='probes', type=int, default=20)
+        parser.add_argument('--timeout', dest='timeout', type=float, default=2.0)
+        parser.add_argument('--no-peer', dest='peer', action='store_false', default=True,
+                            help="Skip the check across processes.")
+
+    def handle(self, *args, **options):
+        cache = invalidation.local_cache('check_invalidation')
+        cache.set('probe', True)
+        invalidation.evict(['probe'])
+        if cache.get('probe') is not None:
+            raise CommandError("Local eviction failed.")
+
+        transport = invalidation.get_transport()
+        latencies = []
+        lost = 0
+        for _ in range(options['probes']):
+            latency = invalidation.probe(timeout=options['timeout'])
+            if latency is None:
+                lost += 1
+            else:
+                latencies.append(latency)
+
+        self.stdout.write("Transport: %s" % transport.__class__.__name__)
+        self.stdout.write("Probes delivered: %s/%s" % (len(latencies), options['probes']))
+        if latencies:
+            self.stdout.write("Delivery time: max %.2f ms, mean %.2f ms" % (
+                max(latencies) * 1000, sum(latencies) * 1000 / len(latencies)
+            ))
+        self.stdout.write("Staleness bound for lost messages: %s s (INVALIDATION_MAX_STALENESS_SECONDS)" %
+                          invalidation.get_max_staleness())
+
+        if not latencies:
+            raise CommandError("No probe was delivered by the transport.")
+
+        if options['peer']:
+            if isinstance(transport, invalidation.LocalTransport):
+                self.stdout.write("Across processes: skipped, LocalTransport doesn't leave the process.")
+            else:
+                self.check_peer()
+
+    def check_peer(self):
+        """
+        Invalidates a key cached by another process and waits for it to be evicted there.
+
+        """
+
+        key = 'check_invalidation:%s' % uuid.uuid4().hex
+        staleness = invalidation.get_max_staleness()
+        process = subprocess.Popen(
+            [sys.executable, '-c', PEER_SCRIPT, key, str(staleness)],
+            cwd=settings.BASE_DIR, env=dict(os.environ), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            if process.stdout.readline().strip() != b'ready':
+                raise CommandError("Peer process failed:\n%s" % process.stderr.read().decode('utf-8', 'replace'))
+
+            lines = []
+            reader = threading.Thread(target=lambda: lines.append(process.stdout.readline().strip()))
+            reader.daemon = True
+            reader.start()
+
+            # Published until evicted, since messages may be lost.
+            started = time.time()
+            sent = 0
+            while reader.is_alive() and time.time() - started < staleness:
+                invalidation.get_transport().publish([key])
+                sent += 1
+                reader.join(PUBLISH_INTERVAL)
+            reader.join(1.0)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+        result = lines[0].decode('ascii') if lines else ''
+        if not result.startswith('evicted'):
+            raise CommandError(
+                "The peer process was not invalidated within the staleness bound (%s s); "
+                "workers rely on expiry only." % staleness
+            )
+        self.stdout.write("Across processes: evicted in %.2f ms (%s message(s) sent)" % (
+            (float(result.split()[1]) - started) * 1000, sent
+        ))
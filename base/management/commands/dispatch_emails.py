@@ -0,0 +1,51 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from base.models import OutboxEmail
+
+
+class Command(BaseCommand):
+    """
+    Sends the emails queued in the outbox, in batches, over one mail connection.
+    Several dispatchers may run concurrently, each claiming different rows.
+    Emails that fail are retried with a backoff, so an outage of the mail
+    server doesn't use up their attempts.
+
+    """
+
+    help = 'Sends the pending emails from the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=100)
+        parser.add_argument('--max-attempts', dest='max_attempts', type=int, default=5,
+                            help="Attempts after which an email is marked as failed.")
+        parser.add_argument('--loop', dest='loop', action='store_true',
+                            help="Keep polling the outbox instead of exiting once it is empty.")
+        parser.add_argument('--interval', dest='interval', type=float, default=1.0,
+                            help="Seconds to wait between polls when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        total = 0
+        try:
+            while True:
+                processed = OutboxEmail.objects.dispatch(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                    connection=connection
+                )
+                total += processed
+                if processed:
+                    continue
+
+                if not options['loop']:
+                    break
+                # Don't hold an idle SMTP connection open while waiting.
+                connection.close()
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
+
+        self.stdout.write("Processed %s emails." % total)
@@ -0,0 +1,261 @@
+import datetime
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from teams.models import INVITE_CODE_LENGTH, Team, TeamInvitation
+
+User = get_user_model()
+
+FIRST_NAMES = ('James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+               'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin')
+
+# Status of the invitations sent to people who didn't join, with their weights.
+OPEN_INVITATION_STATUSES = (
+    (TeamInvitation.PENDING, 0.5),
+    (TeamInvitation.DECLINED, 0.2),
+    (TeamInvitation.EXPIRED, 0.3),
+)
+
+# Team sizes follow a Pareto distribution: most teams are small, a few are large.
+TEAM_SIZE_ALPHA = 1.2
+
+
+@contextmanager
+def explicit_timestamps(*model_classes):
+    """
+    Turns off ``auto_now`` / ``auto_now_add`` of the given models, so that the
+    timestamps set on the instances are the ones saved.
+
+    """
+
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in model_classes for field in model._meta.local_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    """
+    Populates the database with synthetic users, profiles, teams, team
+    memberships and invitations at production-like volumes, to exercise
+    ``UserProfile.objects.expired()``, ``delete_expired_users``,
+    ``expire_invitations`` and the admin pages at scale.
+
+    Distributions:
+
+        users        joined over the last ``--days``, most of them recently
+                     (exponential); ``--verified-ratio`` of them verified and active,
+                     the others pending (expired once older than ``VERIFICATION_KEY_EXPIRY_DAYS``).
+        teams        owned by ``--team-owner-ratio`` of the users, Pareto-distributed
+                     sizes up to ``--max-team-size``; every user is in one team at most.
+        invitations  an accepted invitation per member, plus ``--open-invitations``
+                     on average per team to people who didn't join, pending,
+                     declined or expired (about half of the pending ones past
+                     ``INVITATION_VALIDITY_DAYS``).
+
+    Rows are inserted with ``bulk_create`` in batches of ``--batch-size`` users
+    (with their teams and invitations), one transaction per batch, with
+    primary keys assigned up front. Every user gets the same password
+    (``--password``), hashed once. The data is deterministic for a given
+    ``--seed`` and starting state of the database; usernames and invite
+    codes are derived from the primary keys, so that runs with the same
+    seed add to each other. Team counters and
+    ``UserProfile.team`` are written consistently.
+
+    """
+
+    help = 'Generates synthetic users, teams and invitations at scale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', dest='users', type=int, default=100000)
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=5000)
+        parser.add_argument('--seed', dest='seed', type=int, default=0)
+        parser.add_argument('--days', dest='days', type=int, default=365,
+                            help="Age of the oldest users, in days.")
+        parser.add_argument('--verified-ratio', dest='verified_ratio', type=float, default=0.8)
+        parser.add_argument('--team-owner-ratio', dest='team_owner_ratio', type=float, default=0.02)
+        parser.add_argument('--max-team-size', dest='max_team_size', type=int, default=500)
+        parser.add_argument('--open-invitations', dest='open_invitations', type=float, default=5.0,
+                            help="Mean number of invitations per team not accepted.")
+        parser.add_argument('--password', dest='password', default='synthetic-password')
+        parser.add_argument('--username-prefix', dest='username_prefix', default='synthetic-')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1 or options['days'] < 1:
+            raise CommandError("--users, --batch-size and --days should be positive integers.")
+        if not 0 <= options['verified_ratio'] <= 1 or not 0 <= options['team_owner_ratio'] <= 1:
+            raise CommandError("--verified-ratio and --team-owner-ratio should be between 0 and 1.")
+
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now() if settings.USE_TZ else datetime.datetime.now()
+        self.validity_days = getattr(settings, 'INVITATION_VALIDITY_DAYS', 7)
+        self.password = make_password(options['password'], salt='%012x' % self.random.getrandbits(48))
+        self.max_team_size = max(1, min(options['max_team_size'], options['batch_size']))
+        self.next_ids = dict(
+            (model, (model.objects.aggregate(max_id=models.Max('id'))['max_id'] or 0) + 1)
+            for model in (User, UserProfile, Team, TeamInvitation)
+        )
+
+        started = time.time()
+        created = dict((model, 0) for model in self.next_ids)
+        with explicit_timestamps(UserProfile, Team, TeamInvitation):
+            for offset in range(0, options['users'], options['batch_size']):
+                count = min(options['batch_size'], options['users'] - offset)
+                with transaction.atomic():
+                    for model, rows in self.generate_batch(count):
+                        model.objects.bulk_create(rows)
+                        created[model] = created.get(model, 0) + len(rows)
+                self.stdout.write("%d users (%.0f users/s)" % (
+                    offset + count, (offset + count) / (time.time() - started)
+                ))
+        self.reset_sequences()
+
+        self.stdout.write("Created in %.1f s: %s." % (time.time() - started, ", ".join(
+            "%d %s" % (count, model._meta.verbose_name_plural) for model, count in sorted(
+                created.items(), key=lambda item: item[0]._meta.label
+            )
+        )))
+
+    def take_ids(self, model, count):
+        first = self.next_ids[model]
+        self.next_ids[model] += count
+        return range(first, first + count)
+
+    def random_between(self, oldest, newest, fraction=1.0):
+        # A random date among the oldest ``fraction`` of the range.
+        return oldest + datetime.timedelta(seconds=(newest - oldest).total_seconds() * fraction * self.random.random())
+
+    def random_date(self, newest, oldest_days):
+        return newest - datetime.timedelta(seconds=self.random.uniform(0, oldest_days * 86400))
+
+    def generate_batch(self, count):
+        """
+        Returns the rows of a batch of ``count`` users, with their profiles,
+        teams, memberships and invitations, as ``(model, rows)`` in insertion order.
+
+        """
+
+        rng = self.random
+        days = self.options['days']
+        users = []
+        profiles = []
+        for user_id, profile_id in zip(self.take_ids(User, count), self.take_ids(UserProfile, count)):
+            username = '%s%d' % (self.options['username_prefix'], user_id)
+            date_joined = self.now - datetime.timedelta(seconds=min(rng.expovariate(3.0 / days), days) * 86400)
+            verified = rng.random() < self.options['verified_ratio']
+            users.append(User(
+                id=user_id, username=username, email='%s@example.com' % username, password=self.password,
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                is_active=verified, date_joined=date_joined,
+            ))
+            profiles.append(UserProfile(
+                id=profile_id, user_id=user_id, has_email_verified=verified,
+                verification_key=UserProfile.ACTIVATED if verified else '%040x' % rng.getrandbits(160),
+                last_activity=self.random_between(date_joined, self.now) if verified else None,
+                timestamp_created=date_joined, timestamp_updated=date_joined,
+            ))
+
+        teams, memberships, invitations = self.generate_teams(users, profiles)
+        return [
+            (User, users),
+            (Team, teams),
+            (UserProfile, profiles),
+            (Team.members.through, memberships),
+            (TeamInvitation, invitations),
+        ]
+
+    def generate_teams(self, users, profiles):
+        rng = self.random
+        available = list(range(len(users)))
+        rng.shuffle(available)
+
+        teams = []
+        memberships = []
+        invitations = []
+        owners = int(round(len(users) * self.options['team_owner_ratio']))
+        for team_id in self.take_ids(Team, min(owners, len(available))):
+            owner_index = available.pop()
+            owner = users[owner_index]
+            size = min(int(rng.paretovariate(TEAM_SIZE_ALPHA)), self.max_team_size, len(available) + 1)
+            members = [available.pop() for _ in range(size - 1)]
+            created = self.random_between(owner.date_joined, self.now, 0.1)
+
+            team_invitations = []
+            for index in members:
+                member = users[index]
+                profiles[index].team_id = team_id
+                memberships.append(Team.members.through(team_id=team_id, user_id=member.id))
+                # Invited before joining, and before the team existed for early members.
+                invited = max(member.date_joined - datetime.timedelta(hours=rng.uniform(0, 48)), created)
+                team_invitations.append((member.email, TeamInvitation.ACCEPTED, invited))
+
+            for number in range(int(rng.expovariate(1.0 / self.options['open_invitations']))
+                                if self.options['open_invitations'] > 0 else 0):
+                status = self.weighted_choice(OPEN_INVITATION_STATUSES)
+                if status == TeamInvitation.PENDING:
+                    invited = self.random_date(self.now, 2 * self.validity_days)
+                else:
+                    invited = self.random_date(self.now - datetime.timedelta(self.validity_days), self.options['days'])
+                team_invitations.append((
+                    'invitee-%d-%d@example.com' % (team_id, number), status, max(invited, created)
+                ))
+
+            for invitation_id, (email, status, invited) in zip(
+                    self.take_ids(TeamInvitation, len(team_invitations)), team_invitations):
+                invitations.append(TeamInvitation(
+                    id=invitation_id, invited_by_id=owner.id, team_id=team_id, email=email, status=status,
+                    code=self.invite_code(invitation_id),
+                    timestamp_created=invited, timestamp_updated=invited,
+                ))
+
+            profiles[owner_index].team_id = team_id
+            memberships.append(Team.members.through(team_id=team_id, user_id=owner.id))
+            teams.append(Team(
+                id=team_id, name='%s %s team' % (owner.first_name, owner.last_name), description='',
+                owner_id=owner.id, member_count=len(members) + 1,
+                pending_invitation_count=sum(1 for _, status, _ in team_invitations if status == TeamInvitation.PENDING),
+                timestamp_created=created, timestamp_updated=created,
+            ))
+        return teams, memberships, invitations
+
+    def invite_code(self, invitation_id):
+        # Hex digits of the id followed by random ones: unique across runs with the same seed.
+        prefix = '%x' % invitation_id
+        random_length = INVITE_CODE_LENGTH - len(prefix)
+        return prefix + '%0*x' % (random_length, self.random.getrandbits(4 * random_length))
+
+    def weighted_choice(self, choices):
+        value = self.random.uniform(0, sum(weight for _, weight in choices))
+        for choice, weight in choices:
+            value -= weight
+            if value <= 0:
+                return choice
+        return choices[-1][0]
+
+    def reset_sequences(self):
+        # Primary keys were assigned explicitly; move the sequences past them (as ``loaddata`` does).
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, UserProfile, Team, TeamInvitation])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.six.moves import http_client, urllib
+
+CHEAP_PATH = '/api/accounts/verify/%s/'
+
+
+class Command(BaseCommand):
+    """
+    Load test showing the effect of ``ConcurrencyLimitMiddleware`` on a
+    running (threaded) server.
+
+    A few clients request a cheap endpoint (email verification with an unknown
+    key) alone first, as a baseline, then alongside a storm of clients sending
+    expensive requests (login and / or registration, both hashing a password).
+    With the limits on, the latency of the cheap endpoint stays close to its
+    baseline while the expensive requests over capacity are shed with 503
+    (and retried after the time given by ``Retry-After``, as well-behaved clients do).
+    Run it against the server with and without the limits
+    (``CONCURRENCY_LIMITS = {}``) to compare.
+
+    Registration creates a user per request; point the server at a
+    disposable database.
+
+    """
+
+    help = 'Load tests cheap endpoints against a storm of expensive ones, reporting latency and shedding.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', dest='base_url', default='http://127.0.0.1:8000')
+        parser.add_argument('--duration', dest='duration', type=float, default=10.0,
+                            help="Seconds per phase.")
+        parser.add_argument('--cheap-clients', dest='cheap_clients', type=int, default=2)
+        parser.add_argument('--expensive-clients', dest='expensive_clients', type=int, default=32)
+        parser.add_argument('--expensive', dest='expensive', nargs='+', choices=['login', 'register'],
+                            default=['login'])
+        parser.add_argument('--username', dest='username', default=None, help="Username to log in with.")
+        parser.add_argument('--password', dest='password', default=None)
+        parser.add_argument('--timeout', dest='timeout', type=float, default=30.0)
+        parser.add_argument('--ignore-retry-after', dest='ignore_retry_after', action='store_true', default=False,
+                            help="Retry shed requests right away instead of waiting as told by Retry-After.")
+
+    def handle(self, *args, **options):
+        if options['cheap_clients'] < 1 or options['expensive_clients'] < 1:
+            raise CommandError("--cheap-clients and --expensive-clients should be positive integers.")
+        if 'login' in options['expensive'] and not (options['username'] and options['password']):
+            raise CommandError("--username and --password are required to load test login.")
+
+        self.url = urllib.parse.urlsplit(options['base_url'])
+        if self.url.scheme not in ('http', 'https'):
+            raise CommandError("--base-url should be a http(s) URL.")
+        self.timeout = options['timeout']
+        self.options = options
+
+        baseline = self.run_phase(options['cheap_clients'], 0, options['duration'])
+        storm = self.run_phase(options['cheap_clients'], options['expensive_clients'], options['duration'])
+
+        self.stdout.write("%-10s %-10s %8s %10s %10s %10s  %s" % (
+            'phase', 'endpoint', 'requests', 'p50 (ms)', 'p99 (ms)', 'shed', 'statuses'
+        ))
+        for phase, results in (('baseline', baseline), ('storm', storm)):
+            for endpoint in sorted(results):
+                latencies, statuses = results[endpoint]
+                # Latency of the requests served; shed requests are answered immediately.
+                served = sorted(latency for latency, status in zip(latencies, statuses) if status != 503)
+                self.stdout.write("%-10s %-10s %8d %10s %10s %9.1f%%  %s" % (
+                    phase, endpoint, len(statuses),
+                    self.percentile(served, 50), self.percentile(served, 99),
+                    100.0 * statuses.count(503) / len(statuses),
+                    json.dumps(dict((str(status), statuses.count(status)) for status in set(statuses)), sort_keys=True),
+                ))
+
+    def run_phase(self, cheap_clients, expensive_clients, duration):
+        results = {}
+        lock = threading.Lock()
+        deadline = time.time() + duration
+
+        clients = [threading.Thread(target=self.client, args=(self.cheap_request, deadline, results, lock))
+                   for _ in range(cheap_clients)]
+        clients.extend(threading.Thread(target=self.client, args=(self.expensive_request, deadline, results, lock))
+                       for _ in range(expensive_clients))
+        for client in clients:
+            client.daemon = True
+            client.start()
+        for client in clients:
+            client.join()
+        return results
+
+    def client(self, build_request, deadline, results, lock):
+        connection = self.connect()
+        requests = 0
+        while time.time() < deadline:
+            endpoint, method, path, body = build_request(requests)
+            requests += 1
+            started = time.time()
+            try:
+                connection.request(method, self.url.path.rstrip('/') + path, body=body,
+                                   headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                retry_after = response.getheader('Retry-After')
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+                    connection = self.connect()
+            except (http_client.HTTPException, IOError):
+                connection.close()
+                connection = self.connect()
+                status, retry_after = 0, None
+            latency = time.time() - started
+
+            with lock:
+                latencies, statuses = results.setdefault(endpoint, ([], []))
+                latencies.append(latency)
+                statuses.append(status)
+
+            if status == 503 and retry_after and not self.options['ignore_retry_after']:
+                time.sleep(min(float(retry_after), max(deadline - time.time(), 0)))
+        connection.close()
+
+    def cheap_request(self, index):
+        return 'verify', 'GET', CHEAP_PATH % uuid.uuid4().hex, None
+
+    def expensive_request(self, index):
+        kind = self.options['expensive'][index % len(self.options['expensive'])]
+        if kind == 'login':
+            body = {'username': self.options['username'], 'password': self.options['password']}
+        else:
+            name = 'load-%s' % uuid.uuid4().hex[:12]
+            # Unrelated to the username, for ``UserAttributeSimilarityValidator``.
+            password = uuid.uuid4().hex
+            body = {'username': name, 'email': '%s@example.com' % name, 'first_name': 'Load', 'last_name': 'Test',
+                    'password': password, 'password_2': password}
+        return kind, 'POST', '/api/accounts/%s/' % kind, json.dumps(body)
+
+    def connect(self):
+        connection_class = http_client.HTTPSConnection if self.url.scheme == 'https' else http_client.HTTPConnection
+        return connection_class(self.url.hostname, self.url.port, timeout=self.timeout)
+
+    def percentile(self, latencies, percent):
+        # Nearest-rank percentile, in milliseconds.
+        if not latencies:
+            return '-'
+        index = max(int(round(percent / 100.0 * len(latencies))) - 1, 0)
+        return '%.1f' % (latencies[index] * 1000)
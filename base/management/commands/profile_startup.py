@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, with ``__import__`` wrapped to time every module loaded.
+WORKER_SCRIPT = '''
+import io
+import json
+import sys
+import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+original_import = builtins.__import__
+stack = []
+modules = {}
+
+
+def timed_import(name, *args, **kwargs):
+    before = set(sys.modules)
+    stack.append(0.0)
+    started = time.time()
+    try:
+        return original_import(name, *args, **kwargs)
+    finally:
+        elapsed = time.time() - started
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        # The module named (possibly relative to the importing package) among those newly loaded.
+        loaded = [
+            module for module in set(sys.modules) - before
+            if sys.modules.get(module) is not None and (module == name or module.endswith('.' + name))
+        ]
+        if loaded:
+            module = min(loaded, key=len)
+            total, own = modules.get(module, (0.0, 0.0))
+            modules[module] = (total + elapsed, own + elapsed - children)
+
+builtins.__import__ = timed_import
+phases = []
+
+started = time.time()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+phases.append(('setup', time.time() - started))
+
+if sys.argv[2] == 'prewarm':
+    from base.prewarm import prewarm
+    phases.extend(('prewarm: %s' % name, elapsed) for name, elapsed in prewarm())
+
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+    'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+started = time.time()
+response = application(environ, lambda status, headers, exc_info=None: None)
+for _ in response:
+    pass
+response.close()
+phases.append(('first request', time.time() - started))
+
+builtins.__import__ = original_import
+json.dump({'phases': phases, 'modules': modules}, sys.stdout)
+'''
+
+
+class Command(BaseCommand):
+    """
+    Profiles the boot of a worker in a fresh interpreter: the time spent in
+    each phase (Django setup and app loading, then the first request, which
+    imports the URLconf, views and DRF) and the import time of every module
+    loaded along the way, cumulative (with its own imports) and own.
+
+    With ``--prewarm``, ``base.prewarm.prewarm`` runs before the first request
+    and its steps are reported, showing what is moved off the first request.
+
+    """
+
+    help = 'Profiles worker startup and import time per module.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module', dest='settings_module',
+                            default=os.environ.get('DJANGO_SETTINGS_MODULE', 'i2x_demo.settings'))
+        parser.add_argument('--path', dest='path', default='/api/accounts/user-profile/',
+                            help="Path of the first request.")
+        parser.add_argument('--prewarm', dest='prewarm', action='store_true', default=False)
+        parser.add_argument('--limit', dest='limit', type=int, default=25,
+                            help="Number of modules to list.")
+
+    def handle(self, *args, **options):
+        environ = dict(os.environ, DJANGO_SETTINGS_MODULE=options['settings_module'])
+        process = subprocess.Popen(
+            [sys.executable, '-c', WORKER_SCRIPT, options['path'], 'prewarm' if options['prewarm'] else ''],
+            cwd=settings.BASE_DIR, env=environ, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        output, errors = process.communicate()
+        if process.returncode:
+            raise CommandError("Worker failed:\n%s" % errors.decode('utf-8', 'replace'))
+        result = json.loads(output.decode('utf-8'))
+
+        self.stdout.write("Phases (%s):" % options['settings_module'])
+        for name, elapsed in result['phases']:
+            self.stdout.write("  %-30s %8.1f ms" % (name, elapsed * 1000))
+
+        modules = result['modules']
+        packages = {}
+        for module, (total, own) in modules.items():
+            package = module.split('.')[0]
+            packages[package] = packages.get(package, 0.0) + own
+
+        self.stdout.write("\nImport time by top-level package (own time):")
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:options['limit']]:
+            self.stdout.write("  %-40s %8.1f ms" % (package, own * 1000))
+
+        self.stdout.write("\nSlowest modules (%s loaded):" % len(modules))
+        self.stdout.write("  %-50s %10s %10s" % ('module', 'cumul (ms)', 'own (ms)'))
+        for module, (total, own) in sorted(modules.items(), key=lambda item: -item[1][0])[:options['limit']]:
+            self.stdout.write("  %-50s %10.1f %10.1f" % (module, total * 1000, own * 1000))
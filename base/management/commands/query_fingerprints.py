@@ -0,0 +1,74 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from base import querylog
+
+
+class Command(BaseCommand):
+    """
+    Reports the query fingerprints recorded by ``base.querylog`` across all
+    processes (the files in ``QUERY_LOG_DIRECTORY``), along with the most
+    recent slow queries and their ``EXPLAIN`` output.
+
+    """
+
+    help = 'Reports query fingerprints by count and time, and the recent slow queries.'
+
+    SORT_KEYS = {
+        'total': lambda stats: stats[1],
+        'count': lambda stats: stats[0],
+        'mean': lambda stats: stats[1] / stats[0],
+        'max': lambda stats: stats[2],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', dest='sort', choices=sorted(self.SORT_KEYS), default='total')
+        parser.add_argument('--limit', dest='limit', type=int, default=20)
+        parser.add_argument('--slow', dest='slow', type=int, default=5,
+                            help="Number of recent slow queries to show.")
+        parser.add_argument('--reset', dest='reset', action='store_true', default=False,
+                            help="Delete the recorded statistics after reporting. Running processes keep "
+                                 "theirs in memory and write them back on their next flush; restart them "
+                                 "to start over.")
+
+    def handle(self, *args, **options):
+        directory = querylog.get_directory()
+        paths = [
+            os.path.join(directory, filename) for filename in os.listdir(directory)
+            if filename.startswith('queries-') and filename.endswith('.json')
+        ] if os.path.isdir(directory) else []
+
+        fingerprints = {}
+        slow_queries = []
+        for path in paths:
+            with open(path) as stats_file:
+                data = json.load(stats_file)
+            for key, (count, total, maximum, slow) in data['fingerprints'].items():
+                stats = fingerprints.setdefault(key, [0, 0.0, 0.0, 0])
+                stats[0] += count
+                stats[1] += total
+                stats[2] = max(stats[2], maximum)
+                stats[3] += slow
+            slow_queries.extend(data['slow_queries'])
+
+        self.stdout.write("%s fingerprints from %s processes, by %s:\n" % (len(fingerprints), len(paths), options['sort']))
+        self.stdout.write("%8s %8s %11s %10s %10s  %s" % ('count', 'slow', 'total (ms)', 'mean (ms)', 'max (ms)', 'query'))
+        for key, stats in sorted(fingerprints.items(), key=lambda item: -self.SORT_KEYS[options['sort']](item[1]))[:options['limit']]:
+            self.stdout.write("%8d %8d %11.1f %10.2f %10.2f  %s" % (
+                stats[0], stats[3], stats[1] * 1000, stats[1] * 1000 / stats[0], stats[2] * 1000, key[:200]
+            ))
+
+        if options['slow'] and slow_queries:
+            self.stdout.write("\nMost recent slow queries:")
+            for entry in sorted(slow_queries, key=lambda entry: -entry['timestamp'])[:options['slow']]:
+                self.stdout.write("\n%.1f ms in %s at %s\n  %s" % (
+                    entry['duration_ms'], entry['view'], entry['location'], entry['sql'][:500]
+                ))
+                if entry['plan']:
+                    self.stdout.write('  ' + entry['plan'].replace('\n', '\n  '))
+
+        if options['reset']:
+            for path in paths:
+                os.remove(path)
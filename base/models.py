@@ -1,4 +1,11 @@
-from django.db import models
+import json
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.encoding import force_text
 
 
 class TimeStampedModel(models.Model):
@@ -18,3 +25,227 @@ class TimeStampedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class OutboxEmailManager(models.Manager):
+    """
+    Custom manager for ``OutboxEmail`` model.
+
+    The methods defined here provide shortcuts for queueing emails within
+    the current transaction and for dispatching them in batches.
+
+    """
+
+    # How long a dispatcher has to send the emails it claimed before they can be claimed again.
+    CLAIM_LEASE = datetime.timedelta(minutes=10)
+
+    def build(self, message):
+        """
+        Returns an unsaved ``OutboxEmail`` for given ``EmailMultiAlternatives``.
+
+        """
+
+        html = ''
+        for content, mimetype in getattr(message, 'alternatives', []):
+            if mimetype == 'text/html':
+                html = content
+
+        return self.model(
+            subject=message.subject,
+            body=message.body,
+            html_body=html,
+            from_email=message.from_email,
+            to=json.dumps(message.to)
+        )
+
+    def enqueue(self, message):
+        """
+        Stores an email to be sent by the dispatcher, or sends it right away
+        if ``EMAIL_USE_OUTBOX`` is turned off.
+
+        """
+
+        if not getattr(settings, 'EMAIL_USE_OUTBOX', True):
+            message.send()
+            return None
+        email = self.build(message)
+        email.save()
+        return email
+
+    def enqueue_many(self, messages, batch_size=500):
+        """
+        Same as ``enqueue`` for a list of emails, inserted with ``bulk_create``.
+
+        """
+
+        if not getattr(settings, 'EMAIL_USE_OUTBOX', True):
+            get_connection().send_messages(messages)
+            return
+        self.bulk_create([self.build(message) for message in messages], batch_size=batch_size)
+
+    def dispatch(self, batch_size=100, max_attempts=5, connection=None):
+        """
+        Claims a batch of pending emails due for an attempt and sends them
+        over one connection. A given ``connection`` is left open, so that it
+        can be reused across batches.
+        Rows are claimed in a short transaction, with ``SELECT ... FOR UPDATE
+        SKIP LOCKED``, by moving their ``next_attempt_at`` ``CLAIM_LEASE``
+        ahead, so that concurrent dispatchers never claim the same emails
+        and emails of a dispatcher that died are retried once it expires.
+        They are sent outside of it, each result saved on its own, so that
+        no lock is held during the sends.
+        A failed email is retried after an exponential backoff (see ``get_retry_delay``),
+        and the connection is reopened before the next send; once it can't be
+        reopened, the rest of the batch is deferred the same way.
+        Returns the number of emails processed.
+
+        """
+
+        own_connection = connection is None
+        connection = connection or get_connection()
+        now = timezone.now()
+
+        with transaction.atomic():
+            emails = list(
+                self.select_for_update(skip_locked=True).filter(
+                    models.Q(next_attempt_at__isnull=True) | models.Q(next_attempt_at__lte=now),
+                    status=OutboxEmail.PENDING
+                ).order_by('id')[:batch_size]
+            )
+            if not emails:
+                return 0
+            self.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + self.CLAIM_LEASE)
+
+        reconnect = False
+        # Error of the connection, once it couldn't be (re)opened.
+        connection_error = None
+        try:
+            for email in emails:
+                email.attempts += 1
+                try:
+                    if connection_error is None:
+                        try:
+                            if reconnect:
+                                connection.close()
+                                reconnect = False
+                            connection.open()
+                        except Exception as e:
+                            connection_error = e
+                    if connection_error is not None:
+                        raise connection_error
+                    connection.send_messages([email.get_message(connection)])
+                except Exception as e:
+                    email.last_error = force_text(e, errors='replace')
+                    if email.attempts >= max_attempts:
+                        email.status = OutboxEmail.FAILED
+                        email.next_attempt_at = None
+                    else:
+                        email.next_attempt_at = timezone.now() + self.get_retry_delay(email.attempts)
+                    # The connection may be left in an unusable state.
+                    reconnect = True
+                else:
+                    email.status = OutboxEmail.SENT
+                    email.sent_at = timezone.now()
+                    email.next_attempt_at = None
+                email.save(update_fields=[
+                    'attempts', 'status', 'last_error', 'sent_at', 'next_attempt_at', 'timestamp_updated'
+                ])
+        finally:
+            if own_connection or reconnect:
+                connection.close()
+
+        return len(emails)
+
+    def get_retry_delay(self, attempts):
+        """
+        Returns the delay before the next attempt of an email that failed
+        ``attempts`` times: ``EMAIL_RETRY_DELAY_SECONDS`` doubled after every
+        failure, up to ``EMAIL_RETRY_MAX_DELAY_SECONDS``.
+
+        """
+
+        delay = getattr(settings, 'EMAIL_RETRY_DELAY_SECONDS', 60) * 2 ** (attempts - 1)
+        return datetime.timedelta(seconds=min(delay, getattr(settings, 'EMAIL_RETRY_MAX_DELAY_SECONDS', 3600)))
+
+
+class OutboxEmail(TimeStampedModel):
+    """
+    A model that stores outgoing emails until they are sent by the
+    ``dispatch_emails`` command, so that sending mail happens outside
+    the transaction (and request) that produced it.
+
+    """
+
+    PENDING = 0
+    SENT = 1
+    FAILED = 2
+
+    STATUS_CHOICES = (
+        (PENDING, 'PENDING'),
+        (SENT, 'SENT'),
+        (FAILED, 'FAILED'),
+        )
+
+    subject = models.CharField(
+        max_length=255
+    )
+
+    body = models.TextField(
+        blank=True
+    )
+
+    html_body = models.TextField(
+        blank=True
+    )
+
+    from_email = models.CharField(
+        max_length=255
+    )
+
+    to = models.TextField()
+
+    status = models.IntegerField(
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+
+    attempts = models.PositiveIntegerField(
+        default=0
+    )
+
+    last_error = models.TextField(
+        blank=True
+    )
+
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    objects = OutboxEmailManager()
+
+    class Meta:
+        index_together = ('status', 'id')
+        verbose_name = u'outbox email'
+        verbose_name_plural = u'outbox emails'
+
+    def __str__(self):
+        return "To : %s | %s" % (", ".join(json.loads(self.to)), self.subject)
+
+    def get_message(self, connection=None):
+        """
+        Returns the ``EmailMultiAlternatives`` to be sent for this email.
+
+        """
+
+        msg = EmailMultiAlternatives(
+            self.subject, self.body, self.from_email, json.loads(self.to), connection=connection
+        )
+        if self.html_body:
+            msg.attach_alternative(self.html_body, "text/html")
+        return msg
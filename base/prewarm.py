@@ -0,0 +1,145 @@
+"""
+Pre-warming of a worker before it accepts traffic.
+
+Django and DRF defer a lot of work to the first request that needs it: the
+URLconf (and with it every view, serializer and DRF module) is imported on the
+first request, templates are compiled on first render, and password hashers
+and validators are instantiated on first use. ``prewarm`` does that work up
+front, so that the first requests served by a new worker are as fast as the
+following ones. With a pre-forking server (e.g. ``gunicorn --preload``) it
+runs once in the master and the result is shared by every worker; per-process
+state (the invalidation transport and its node id, the activity flushing
+thread) is still set up by each worker, on first use.
+
+It is run by the WSGI entry points when ``WORKER_PREWARM`` is turned on.
+
+"""
+
+import logging
+import os
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def warm_urls():
+    """
+    Imports the URLconf along with every view, and fills the resolver caches.
+
+    """
+
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def warm_serializers():
+    """
+    Instantiates the serializer of every view and builds its fields, so that
+    the serializer modules and the DRF field / validator machinery are loaded.
+
+    """
+
+    from django.urls import get_resolver
+    from rest_framework.settings import api_settings
+
+    # Imported from their dotted paths on first access.
+    for setting in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                    'DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES'):
+        getattr(api_settings, setting)
+
+    warmed = set()
+    patterns = list(get_resolver().url_patterns)
+    while patterns:
+        pattern = patterns.pop()
+        if hasattr(pattern, 'url_patterns'):
+            patterns.extend(pattern.url_patterns)
+            continue
+        view_class = getattr(pattern.callback, 'cls', None)
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if serializer_class is None or serializer_class in warmed:
+            continue
+        warmed.add(serializer_class)
+        try:
+            serializer_class(context={}).fields
+        except Exception:
+            # Serializers needing a specific context are skipped; their module is loaded regardless.
+            logger.debug("Could not build the fields of %s.", serializer_class.__name__, exc_info=True)
+    return len(warmed)
+
+
+def warm_templates():
+    """
+    Compiles the templates of ``TEMPLATES['DIRS']`` (the email templates).
+    With the cached template loader (the default when ``DEBUG`` is off)
+    they are reused from then on.
+
+    """
+
+    from django.template.loader import get_template
+
+    count = 0
+    for config in settings.TEMPLATES:
+        for directory in config.get('DIRS', []):
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(TEMPLATE_EXTENSIONS):
+                        get_template(os.path.relpath(os.path.join(root, name), directory))
+                        count += 1
+    return count
+
+
+def warm_passwords():
+    """
+    Instantiates the password hashers and validators (the common password
+    validator reads its word list, the breached password validator maps its index).
+
+    """
+
+    from django.contrib.auth import password_validation
+    from django.contrib.auth.hashers import get_hashers
+
+    from accounts.password_validation import BreachedPasswordValidator, get_index
+
+    get_hashers()
+    validators = password_validation.get_default_password_validators()
+    for validator in validators:
+        if isinstance(validator, BreachedPasswordValidator) and validator.get_index_path():
+            get_index(validator.get_index_path())
+    return len(validators)
+
+
+STEPS = (
+    ('urls', warm_urls),
+    ('serializers', warm_serializers),
+    ('templates', warm_templates),
+    ('passwords', warm_passwords),
+)
+
+
+def prewarm():
+    """
+    Runs every pre-warming step. Returns the time taken by each, in seconds.
+
+    """
+
+    timings = []
+    for name, step in STEPS:
+        started = time.time()
+        step()
+        timings.append((name, time.time() - started))
+
+    logger.info("Pre-warmed in %.1f ms (%s).", sum(elapsed for _, elapsed in timings) * 1000,
+                ", ".join("%s %.1f ms" % (name, elapsed * 1000) for name, elapsed in timings))
+    return timings
+
+
+def prewarm_if_enabled():
+    if getattr(settings, 'WORKER_PREWARM', False):
+        return prewarm()
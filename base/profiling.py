@@ -0,0 +1,222 @@
+"""
+Opt-in per-request profiling.
+
+``ProfilingMiddleware`` profiles a sample of the requests (``PROFILING_SAMPLE_RATE``)
+and every request sent with an ``X-Profile`` header matching ``PROFILING_SECRET``.
+Each capture is written to ``PROFILING_DIRECTORY`` as a ``.json`` summary along with:
+
+    cprofile  - a ``.pstats`` file (``python -m pstats``, snakeviz, ...), the default.
+    sampling  - a ``.collapsed`` file of stacks sampled every ``PROFILING_SAMPLING_INTERVAL``
+                seconds from another thread, for flame graphs (flamegraph.pl, speedscope).
+                Much lower overhead than cProfile, suited to sampling production traffic.
+
+Only the ``PROFILING_MAX_CAPTURES`` most recent captures are kept. Captures are
+listed, slowest first, on the admin page at ``/admin/profiles/``.
+
+With neither a sample rate nor a secret set, the middleware removes itself at startup.
+
+"""
+
+import binascii
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.crypto import constant_time_compare
+
+CPROFILE = 'cprofile'
+SAMPLING = 'sampling'
+
+CAPTURE_NAME_RE = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+
+def get_directory():
+    return getattr(settings, 'PROFILING_DIRECTORY', os.path.join(tempfile.gettempdir(), 'i2x_profiles'))
+
+
+class StackSampler(object):
+    """
+    Samples the stack of a thread from a background thread, every ``interval``
+    seconds, counting identical stacks in collapsed-stack format.
+
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.running = threading.Event()
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, name='profiling-sampler')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        self.thread.join()
+
+    def run(self):
+        while self.running.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%s)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, 'w') as collapsed:
+            for stack, count in sorted(self.stacks.items()):
+                collapsed.write('%s %s\n' % (stack, count))
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles sampled requests, or requests sent with the ``X-Profile`` secret,
+    and writes the captures to ``PROFILING_DIRECTORY``. The response of a
+    profiled request carries the capture name in ``X-Profile-Capture``.
+
+    Place it last in ``MIDDLEWARE``, so that it measures the view only.
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.secret = getattr(settings, 'PROFILING_SECRET', None)
+        if not self.sample_rate and not self.secret:
+            raise MiddlewareNotUsed
+
+        self.mode = getattr(settings, 'PROFILING_MODE', CPROFILE)
+        self.interval = getattr(settings, 'PROFILING_SAMPLING_INTERVAL', 0.005)
+        self.max_captures = getattr(settings, 'PROFILING_MAX_CAPTURES', 200)
+        self.directory = get_directory()
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            # Already created (e.g. by another worker).
+            if not os.path.isdir(self.directory):
+                raise
+
+    def should_profile(self, request):
+        header = request.META.get('HTTP_X_PROFILE')
+        if header and self.secret and constant_time_compare(header, self.secret):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        if self.mode == SAMPLING:
+            profiler = StackSampler(threading.current_thread().ident, self.interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        started = time.time()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.time() - started
+            if self.mode == SAMPLING:
+                profiler.stop()
+            else:
+                profiler.disable()
+
+        name = self.save(request, response, profiler, duration)
+        response['X-Profile-Capture'] = name
+        return response
+
+    def save(self, request, response, profiler, duration):
+        name = '%d-%s' % (time.time() * 1000, binascii.hexlify(os.urandom(4)).decode('ascii'))
+        path = os.path.join(self.directory, name)
+
+        if self.mode == SAMPLING:
+            profiler.write(path + '.collapsed')
+        else:
+            profiler.dump_stats(path + '.pstats')
+
+        with open(path + '.json', 'w') as summary:
+            json.dump({
+                'name': name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'mode': self.mode,
+                'timestamp': time.time(),
+            }, summary)
+
+        rotate(self.directory, self.max_captures)
+        return name
+
+
+def capture_names(directory):
+    # Capture names start with a millisecond timestamp, so they sort chronologically.
+    return sorted(
+        filename[:-len('.json')] for filename in os.listdir(directory) if filename.endswith('.json')
+    ) if os.path.isdir(directory) else []
+
+
+def rotate(directory, max_captures):
+    """
+    Deletes the oldest captures, keeping ``max_captures``.
+
+    """
+
+    for name in capture_names(directory)[:-max_captures or None]:
+        for extension in ('.json', '.pstats', '.collapsed'):
+            try:
+                os.remove(os.path.join(directory, name + extension))
+            except OSError:
+                pass
+
+
+def list_captures(directory=None, limit=50):
+    """
+    Returns the summaries of the captures, slowest first.
+
+    """
+
+    directory = directory or get_directory()
+    captures = []
+    for name in capture_names(directory):
+        try:
+            with open(os.path.join(directory, name + '.json')) as summary:
+                captures.append(json.load(summary))
+        except (IOError, ValueError):
+            # Deleted by a concurrent rotation or still being written.
+            continue
+    return sorted(captures, key=lambda capture: -capture['duration_ms'])[:limit]
+
+
+def get_capture_path(name, directory=None):
+    """
+    Returns the path of the profile file of given capture, or ``None``.
+
+    """
+
+    if not CAPTURE_NAME_RE.match(name):
+        return None
+    directory = directory or get_directory()
+    for extension in ('.pstats', '.collapsed'):
+        path = os.path.join(directory, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
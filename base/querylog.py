@@ -0,0 +1,287 @@
+"""
+Slow-query log and query fingerprint statistics.
+
+Every query run through the ORM (or ``connection.cursor()``) is timed and
+aggregated by fingerprint: the SQL with literals, parameters and ``IN`` lists
+normalized away, so that all executions of one ORM call site add up under a
+single entry. Queries slower than ``SLOW_QUERY_THRESHOLD_MS`` are logged
+(``base.querylog`` logger) along with the originating view and code location
+and, on SQLite and PostgreSQL, the ``EXPLAIN`` output of the query.
+
+Statistics are kept per process and written to ``QUERY_LOG_DIRECTORY`` (one
+file per process) every ``QUERY_LOG_FLUSH_INTERVAL_SECONDS`` and at exit. The
+``query_fingerprints`` command merges and reports them.
+
+Turned on by setting ``SLOW_QUERY_THRESHOLD_MS`` (0 to log every query).
+Django 1.11 has no ``connection.execute_wrapper``, so the cursors of every
+connection are wrapped as the connection is created.
+
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import traceback
+
+import django
+import rest_framework
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
+from django.db.backends import utils as backend_utils
+from django.db.backends.signals import connection_created
+
+from base.utils import get_view_name
+
+logger = logging.getLogger(__name__)
+
+MAX_FINGERPRINTS = 2000
+
+MAX_SLOW_QUERIES = 100
+
+EXPLAIN_SQL = {
+    'sqlite': 'EXPLAIN QUERY PLAN %s',
+    'postgresql': 'EXPLAIN %s',
+}
+
+# Frames from these paths are skipped when looking for the code location of a query.
+IGNORED_PATHS = (
+    os.path.dirname(django.__file__),
+    os.path.dirname(rest_framework.__file__),
+    os.path.splitext(__file__)[0],
+)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+_local = threading.local()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_fingerprints = {}
+_slow_queries = []
+_last_flush = [time.time()]
+
+
+def get_threshold():
+    threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+    return None if threshold is None else threshold / 1000.0
+
+
+def get_directory():
+    return getattr(settings, 'QUERY_LOG_DIRECTORY', os.path.join(tempfile.gettempdir(), 'i2x_querylog'))
+
+
+def fingerprint(sql):
+    """
+    Normalizes given SQL, so that executions differing only by their values
+    (including the length of ``IN`` lists) have the same fingerprint.
+
+    """
+
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def code_location():
+    """
+    Returns ``path:line in function`` of the innermost frame outside of
+    Django, DRF and this module, i.e. the code that made the query.
+
+    """
+
+    for path, line, function, _ in reversed(traceback.extract_stack()):
+        if not path.startswith(IGNORED_PATHS) and 'site-packages' not in path:
+            return '%s:%s in %s' % (os.path.relpath(path, settings.BASE_DIR), line, function)
+    return None
+
+
+def explain(db, sql, params):
+    """
+    Returns the query plan of given query, or ``None`` if not supported.
+    Only ``SELECT`` statements are explained.
+
+    """
+
+    template = EXPLAIN_SQL.get(db.vendor)
+    if template is None or not sql.lstrip().upper().startswith('SELECT'):
+        return None
+
+    # A separate, unwrapped cursor, so that the results of the explained query are left untouched.
+    cursor = backend_utils.CursorWrapper(db.create_cursor(), db)
+    try:
+        cursor.execute(template % sql, params)
+        return u'\n'.join(u' '.join(u'%s' % column for column in row) for row in cursor.fetchall())
+    except DatabaseError as e:
+        return 'EXPLAIN failed: %s' % e
+    finally:
+        cursor.close()
+
+
+def record(db, sql, params, duration, many=False):
+    key = fingerprint(sql)
+    threshold = get_threshold()
+    slow = threshold is not None and duration >= threshold
+
+    with _lock:
+        stats = _fingerprints.get(key)
+        if stats is None:
+            if len(_fingerprints) >= MAX_FINGERPRINTS:
+                key = '(other)'
+                stats = _fingerprints.setdefault(key, [0, 0.0, 0.0, 0])
+            else:
+                stats = _fingerprints[key] = [0, 0.0, 0.0, 0]
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+        stats[3] += 1 if slow else 0
+
+    if slow:
+        entry = {
+            'sql': sql,
+            'fingerprint': key,
+            'duration_ms': round(duration * 1000, 2),
+            'view': getattr(_local, 'view', None),
+            'location': code_location(),
+            'plan': None if many else explain(db, sql, params),
+            'timestamp': time.time(),
+        }
+        logger.warning(
+            "Slow query (%.1f ms) in %s at %s: %s\n%s",
+            entry['duration_ms'], entry['view'], entry['location'], sql, entry['plan'] or ''
+        )
+        with _lock:
+            _slow_queries.append(entry)
+            del _slow_queries[:-MAX_SLOW_QUERIES]
+
+    if time.time() - _last_flush[0] >= getattr(settings, 'QUERY_LOG_FLUSH_INTERVAL_SECONDS', 10):
+        flush(wait=False)
+
+
+def flush(wait=True):
+    """
+    Writes the statistics of this process to ``QUERY_LOG_DIRECTORY``.
+    One thread flushes at a time: with ``wait=False``, returns right away
+    if another one is flushing.
+
+    """
+
+    if not _flush_lock.acquire(wait):
+        return
+    try:
+        _last_flush[0] = time.time()
+        with _lock:
+            data = {
+                'pid': os.getpid(),
+                'fingerprints': dict((key, list(stats)) for key, stats in _fingerprints.items()),
+                'slow_queries': list(_slow_queries),
+            }
+        if not data['fingerprints']:
+            return
+
+        directory = get_directory()
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+        path = os.path.join(directory, 'queries-%s.json' % os.getpid())
+        with open(path + '.tmp', 'w') as stats_file:
+            json.dump(data, stats_file)
+        os.rename(path + '.tmp', path)
+    finally:
+        _flush_lock.release()
+
+
+def reset():
+    with _lock:
+        _fingerprints.clear()
+        del _slow_queries[:]
+
+
+class InstrumentedCursor(object):
+    """
+    Times the queries run through a Django cursor wrapper.
+
+    """
+
+    def __init__(self, cursor, db):
+        self.cursor = cursor
+        self.db = db
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.cursor.__exit__(type, value, traceback)
+
+    def execute(self, sql, params=None):
+        started = time.time()
+        result = self.cursor.execute(sql, params)
+        record(self.db, sql, params, time.time() - started)
+        return result
+
+    def executemany(self, sql, param_list):
+        started = time.time()
+        result = self.cursor.executemany(sql, param_list)
+        record(self.db, sql, None, time.time() - started, many=True)
+        return result
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # Fired again when the connection is re-established, hence the guard.
+    if getattr(connection, 'querylog_installed', False):
+        return
+    connection.querylog_installed = True
+
+    make_cursor, make_debug_cursor = connection.make_cursor, connection.make_debug_cursor
+    connection.make_cursor = lambda cursor: InstrumentedCursor(make_cursor(cursor), connection)
+    connection.make_debug_cursor = lambda cursor: InstrumentedCursor(make_debug_cursor(cursor), connection)
+
+
+def install():
+    """
+    Instruments every database connection, if ``SLOW_QUERY_THRESHOLD_MS`` is set.
+
+    """
+
+    if get_threshold() is None:
+        return
+    connection_created.connect(instrument_connection, dispatch_uid='querylog_instrument_connection')
+    atexit.register(flush)
+
+
+class QueryLogMiddleware(object):
+    """
+    Records the view being served, to attribute slow queries to it.
+
+    """
+
+    def __init__(self, get_response):
+        if get_threshold() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            _local.view = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = get_view_name(view_func)
@@ -0,0 +1,31 @@
+from collections import OrderedDict
+
+
+class RowSerializer(object):
+    """
+    A read-only serializer for plain rows (dicts from ``values()``), for hot
+    read paths where the per-instance field building of DRF serializers shows up.
+
+    ``fields`` are the output keys, read from ``prefix + field`` in the row.
+    The lookups are computed once, when the serializer is instantiated, so
+    serializers are meant to be created at module level and reused.
+
+    """
+
+    fields = ()
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.mapping = tuple((field, prefix + field) for field in self.fields)
+
+    @property
+    def lookups(self):
+        """
+        The lookups to pass to ``values()`` for this serializer.
+
+        """
+
+        return tuple(lookup for field, lookup in self.mapping)
+
+    def to_representation(self, row):
+        return OrderedDict([(field, row[lookup]) for field, lookup in self.mapping])
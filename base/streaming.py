@@ -0,0 +1,77 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Echo(object):
+    """
+    A file-like object that returns whatever is written to it,
+    so that ``csv.writer`` can be used to produce rows lazily.
+
+    """
+
+    def write(self, value):
+        return value
+
+
+def keyset_chunks(queryset, key='id', chunk_size=1000):
+    """
+    Iterates over a queryset in lists of at most ``chunk_size`` rows ordered
+    by ``key``, fetching each chunk with ``key > last seen value`` instead of
+    OFFSET. ``key`` must be a unique, indexed column (usually the primary key).
+    Memory usage is bounded by ``chunk_size`` regardless of table size.
+
+    """
+
+    queryset = queryset.order_by(key)
+    last = None
+
+    while True:
+        chunk = queryset if last is None else queryset.filter(**{'%s__gt' % key: last})
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+
+        yield rows
+
+        row = rows[-1]
+        last = row[key] if isinstance(row, dict) else getattr(row, key)
+        if len(rows) < chunk_size:
+            return
+
+
+def keyset_iterator(queryset, key='id', chunk_size=1000):
+    """
+    Same as ``keyset_chunks``, but yields the rows one by one.
+
+    """
+
+    for rows in keyset_chunks(queryset, key=key, chunk_size=chunk_size):
+        for row in rows:
+            yield row
+
+
+def csv_lines(rows, fields):
+    """
+    Yields a CSV header followed by one CSV line per row dict.
+
+    """
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row.get(field) for field in fields])
+
+
+def ndjson_lines(rows, fields):
+    """
+    Yields one JSON document per line for every row dict.
+
+    """
+
+    for row in rows:
+        yield json.dumps(
+            dict((field, row.get(field)) for field in fields),
+            cls=DjangoJSONEncoder
+        ) + '\n'
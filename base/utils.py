@@ -31,3 +31,24 @@ def base36decode(number):
     """
 
     return int(number, 36)
+
+
+def chunked(items, size):
+    """
+    Splits a list into lists of at most ``size`` items.
+
+    """
+
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def get_view_name(view_func):
+    """
+    Returns the dotted path of the view class (for class-based views) or
+    function of a resolved view, e.g. ``accounts.api.views.UserLoginAPIView``.
+
+    """
+
+    view = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None) or view_func
+    return '%s.%s' % (view.__module__, getattr(view, '__name__', view.__class__.__name__))
@@ -0,0 +1,34 @@
+import os
+
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+from base import profiling
+
+
+def captured_profiles(request):
+    """
+    Admin page listing the slowest requests captured by ``ProfilingMiddleware``.
+
+    """
+
+    return render(request, 'admin/base/captured_profiles.html', {
+        'title': 'Slowest profiled requests',
+        'captures': profiling.list_captures(),
+        'directory': profiling.get_directory(),
+    })
+
+
+def captured_profile_download(request, name):
+    """
+    Downloads the ``.pstats`` / ``.collapsed`` file of a capture.
+
+    """
+
+    path = profiling.get_capture_path(name)
+    if path is None:
+        raise Http404("Capture not found.")
+
+    response = FileResponse(open(path, 'rb'), content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(path)
+    return response
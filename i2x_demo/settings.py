@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'base',
     'accounts',
     'teams',
 ]
@@ -51,6 +52,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'base.concurrency.ConcurrencyLimitMiddleware',
+    'base.querylog.QueryLogMiddleware',
+    'base.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'i2x_demo.urls'
@@ -101,6 +105,19 @@ AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
     },
+    {
+        'NAME': 'accounts.password_validation.BreachedPasswordValidator',
+    },
+]
+
+
+PASSWORD_HASHERS = [
+    'accounts.hashers.CalibratedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
 ]
 
 
@@ -134,6 +151,8 @@ VERIFICATION_KEY_EXPIRY_DAYS = 2
 
 SITE_NAME = "i2x Demo"
 
+EMAIL_USE_OUTBOX = True
+
 try:
     from local_settings import *
 except ImportError:
@@ -0,0 +1,52 @@
+"""
+Production settings profile for the API workers of i2x_demo.
+
+The ``accounts`` and ``teams`` APIs authenticate by token and render JSON only,
+so the apps and middleware serving sessions, messages, CSRF, clickjacking
+protection, static files and the admin are left out of the request path.
+The admin is served by a separate deployment using ``i2x_demo.settings``
+(``i2x_demo.wsgi``), which also exposes the API.
+
+Serve with the ``i2x_demo.wsgi_api`` WSGI application.
+"""
+
+from .settings import *  # noqa
+
+API_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'base.concurrency.ConcurrencyLimitMiddleware',
+    'base.querylog.QueryLogMiddleware',
+    'base.profiling.ProfilingMiddleware',
+]
+
+ROOT_URLCONF = 'i2x_demo.urls_api'
+
+WSGI_APPLICATION = 'i2x_demo.wsgi_api.application'
+
+TEMPLATES = [
+    dict(TEMPLATES[0], OPTIONS=dict(TEMPLATES[0]['OPTIONS'], context_processors=[
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ])),
+]
+
+REST_FRAMEWORK = dict(globals().get('REST_FRAMEWORK', {}), **{
+    # Session authentication and the browsable API depend on the apps left out above.
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'accounts.authentication.SignedTokenAuthentication',
+        'accounts.authentication.ExpiringTokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+    ),
+})
@@ -1,11 +1,19 @@
-from django.conf.urls import url, include
+from django.conf.urls import url
 from django.contrib import admin
 
+from base import views as base_views
+from .urls_api import urlpatterns as api_urlpatterns
+
 urlpatterns = [
 
-    url(r'^admin/', admin.site.urls),
+    url(r'^admin/profiles/$',
+        admin.site.admin_view(base_views.captured_profiles),
+        name='admin_captured_profiles'),
 
-    url(r'^api/accounts/', include('accounts.api.urls')),
+    url(r'^admin/profiles/(?P<name>[0-9]+-[0-9a-f]{8})/$',
+        admin.site.admin_view(base_views.captured_profile_download),
+        name='admin_captured_profile_download'),
+
+    url(r'^admin/', admin.site.urls),
 
-    url(r'^api/teams/', include('teams.api.urls')),
-]
+] + api_urlpatterns
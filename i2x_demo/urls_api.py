@@ -0,0 +1,8 @@
+from django.conf.urls import url, include
+
+urlpatterns = [
+
+    url(r'^api/accounts/', include('accounts.api.urls')),
+
+    url(r'^api/teams/', include('teams.api.urls')),
+]
@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from base.prewarm import prewarm_if_enabled
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "i2x_demo.settings")
 
 application = get_wsgi_application()
+
+# Loads URLs, serializers, templates and password validators up front when WORKER_PREWARM is on.
+prewarm_if_enabled()
@@ -0,0 +1,19 @@
+"""
+WSGI config for the API workers of i2x_demo (``i2x_demo.settings_api``).
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+The admin is served by ``i2x_demo.wsgi``.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+from base.prewarm import prewarm_if_enabled
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "i2x_demo.settings_api")
+
+application = get_wsgi_application()
+
+# Loads URLs, serializers, templates and password validators up front when WORKER_PREWARM is on.
+prewarm_if_enabled()
@@ -1 +1,3 @@
 __author__ = 'askar'
+
+default_app_config = 'teams.apps.TeamsConfig'
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination on the primary key.
+    Pages are fetched with ``id > cursor`` on an indexed column,
+    so deep pages cost the same as the first one.
+
+    """
+
+    ordering = 'id'
+    page_size = 100
@@ -1,7 +1,15 @@
+import csv
+
 from rest_framework import serializers
 
-from teams.models import Team
+from base import serializers as base_serializers
+from base import utils as base_utils
+from teams.models import Team, TeamInvitation
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
+from django.db.models.functions import Lower
 
 User = get_user_model()
 
@@ -25,7 +33,16 @@ class TeamSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Team
-        fields = ['id', 'name', 'description']
+        fields = ['id', 'name', 'description', 'member_count', 'pending_invitation_count']
+
+
+class TeamRowSerializer(base_serializers.RowSerializer):
+    """
+    Fast-path equivalent of ``TeamSerializer`` for ``values()`` rows.
+
+    """
+
+    fields = TeamSerializer.Meta.fields
 
 
 class TeamInvitationCreateSerializer(serializers.Serializer):
@@ -50,6 +67,7 @@ class TeamInvitationCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError("Team does not exist.")
 
         if team.has_invite_permissions(user):
+            self.team = team
             email_ids_existing = User.objects.filter(email__in=emails).values_list('email', flat=True)
             if email_ids_existing:
                 raise serializers.ValidationError(
@@ -58,3 +76,113 @@ class TeamInvitationCreateSerializer(serializers.Serializer):
             return data
 
         raise serializers.ValidationError("Operation not allowed.")
+
+
+class TeamInvitationBulkCreateSerializer(serializers.Serializer):
+    """
+    Validates a bulk invitation given either as a list of ``emails``
+    or as an uploaded CSV ``file`` having the email addresses in its first column.
+
+    On success, ``validated_data['emails']`` holds the addresses to be invited
+    and ``results`` holds the outcome for every address given.
+
+    """
+
+    INVITED = 'invited'
+    INVALID = 'invalid'
+    DUPLICATE = 'duplicate'
+    EXISTING_USER = 'existing_user'
+    ALREADY_INVITED = 'already_invited'
+
+    LOOKUP_CHUNK_SIZE = 500
+
+    emails = serializers.ListField(
+        child=serializers.CharField(allow_blank=True, trim_whitespace=False),
+        required=False,
+        write_only=True
+    )
+
+    file = serializers.FileField(
+        required=False,
+        write_only=True
+    )
+
+    def get_maximum_emails_allowed(self):
+        return getattr(settings, 'BULK_INVITATION_MAX_EMAILS', 5000)
+
+    def read_csv_emails(self, csv_file):
+        try:
+            content = csv_file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise serializers.ValidationError("File should be a UTF-8 encoded CSV.")
+
+        emails = []
+        for row in csv.reader(content.splitlines()):
+            if row and row[0].strip().lower() != 'email':
+                emails.append(row[0])
+        return emails
+
+    def validate(self, data):
+        if 'file' in data:
+            emails = self.read_csv_emails(data['file'])
+        elif 'emails' in data:
+            emails = data['emails']
+        else:
+            raise serializers.ValidationError("Either emails or file is required.")
+
+        maximum_emails_allowed = self.get_maximum_emails_allowed()
+        if len(emails) > maximum_emails_allowed:
+            raise serializers.ValidationError("Not more than %s email ID's are allowed." % maximum_emails_allowed)
+
+        team_pk = self.context.get('team_pk')
+        user = self.context.get('user')
+
+        try:
+            team = Team.objects.get(pk=team_pk)
+        except Team.DoesNotExist:
+            raise serializers.ValidationError("Team does not exist.")
+
+        if not team.has_invite_permissions(user):
+            raise serializers.ValidationError("Operation not allowed.")
+
+        self.team = team
+        self.results = []
+        candidates = []
+        seen = set()
+
+        for email in emails:
+            normalized = email.strip().lower()
+            try:
+                validate_email(normalized)
+            except DjangoValidationError:
+                self.results.append({'email': email, 'status': self.INVALID})
+                continue
+            if normalized in seen:
+                self.results.append({'email': normalized, 'status': self.DUPLICATE})
+                continue
+            seen.add(normalized)
+            candidates.append({'email': normalized, 'status': self.INVITED})
+            self.results.append(candidates[-1])
+
+        existing_users = set()
+        for chunk in base_utils.chunked(sorted(seen), self.LOOKUP_CHUNK_SIZE):
+            existing_users.update(
+                User.objects.annotate(
+                    email_lower=Lower('email')
+                ).filter(
+                    email_lower__in=chunk
+                ).values_list('email_lower', flat=True)
+            )
+        already_invited = TeamInvitation.objects.pending_emails(
+            seen - existing_users, chunk_size=self.LOOKUP_CHUNK_SIZE
+        )
+
+        for result in candidates:
+            if result['email'] in existing_users:
+                result['status'] = self.EXISTING_USER
+            elif result['email'] in already_invited:
+                result['status'] = self.ALREADY_INVITED
+
+        return {
+            'emails': [result['email'] for result in candidates if result['status'] == self.INVITED]
+        }
@@ -13,4 +13,24 @@ urlpatterns = [
         views.InviteToTeamAPIView.as_view(),
         name='invite_to_team'),
 
+    url(r'^(?P<pk>[0-9]+)/invite/bulk/$',
+        views.BulkInviteToTeamAPIView.as_view(),
+        name='bulk_invite_to_team'),
+
+    url(r'^(?P<pk>[0-9]+)/members/$',
+        views.TeamMemberListAPIView.as_view(),
+        name='team_members'),
+
+    url(r'^(?P<pk>[0-9]+)/members/export/$',
+        views.TeamMemberExportAPIView.as_view(),
+        name='team_members_export'),
+
+    url(r'^(?P<pk>[0-9]+)/invitations/$',
+        views.TeamInvitationListAPIView.as_view(),
+        name='team_invitations'),
+
+    url(r'^(?P<pk>[0-9]+)/invitations/export/$',
+        views.TeamInvitationExportAPIView.as_view(),
+        name='team_invitations_export'),
+
 ]
@@ -1,11 +1,20 @@
+from django.contrib.auth import get_user_model
 from django.contrib.sites.shortcuts import get_current_site
-from rest_framework import generics, permissions, status
-from rest_framework.authentication import TokenAuthentication
+from django.http import StreamingHttpResponse
+from rest_framework import exceptions, generics, permissions, status
 from rest_framework.response import Response
 
 from . import serializers
+from .pagination import KeysetPagination
+from accounts.authentication import ExpiringTokenAuthentication, SignedTokenAuthentication
+from base import streaming
+from base.idempotency import idempotent
+from base import utils as base_utils
+from base.models import OutboxEmail
 from teams.models import Team, TeamInvitation
 
+User = get_user_model()
+
 
 class CreateTeamAPIView(generics.CreateAPIView):
     """
@@ -14,7 +23,7 @@ class CreateTeamAPIView(generics.CreateAPIView):
     """
 
     permission_classes = (permissions.IsAuthenticated, )
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication, )
     serializer_class = serializers.TeamCreateSerializer
     queryset = Team.objects.all()
 
@@ -37,10 +46,11 @@ class InviteToTeamAPIView(generics.CreateAPIView):
     """
 
     permission_classes = (permissions.IsAuthenticated, )
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication, )
     serializer_class = serializers.TeamInvitationCreateSerializer
     queryset = TeamInvitation.objects.all()
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data,
                                            context={
@@ -49,20 +59,194 @@ class InviteToTeamAPIView(generics.CreateAPIView):
                                            })
         if serializer.is_valid(raise_exception=True):
             email_ids = serializer.validated_data.get('emails')
+            self.team = serializer.team
             self.create_invitations(email_ids=email_ids, invited_by=request.user)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def create_invitations(self, email_ids, invited_by):
-        invitations = [TeamInvitation(email=email_id, invited_by=invited_by)
-                       for email_id in email_ids]
-        invitations = TeamInvitation.objects.bulk_create(invitations)
+        invitations = TeamInvitation.objects.create_invitations(email_ids, invited_by, team=self.team)
         self.send_email_invites(invitations)
 
     def send_email_invites(self, invitations):
-        # Sending email expected to be done asynchronously in production environment.
+        # Emails are queued in the outbox and sent by the dispatch_emails command.
         for invitation in invitations:
-            invitation.send_email_invite(get_current_site(self.request))
+            invitation.send_email_invite(get_current_site(self.request), team=self.team)
+
+
+class BulkInviteToTeamAPIView(InviteToTeamAPIView):
+    """
+    Endpoint to invite a large number of people to a team at once.
+    Accepts a JSON list of ``emails`` or an uploaded CSV ``file``,
+    and returns the outcome for every address.
+
+    """
+
+    serializer_class = serializers.TeamInvitationBulkCreateSerializer
+
+    INSERT_BATCH_SIZE = 500
+    MAIL_BATCH_SIZE = 100
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={
+                                               'user': request.user,
+                                               'team_pk': kwargs['pk']
+                                           })
+        serializer.is_valid(raise_exception=True)
+
+        email_ids = serializer.validated_data.get('emails')
+        self.team = serializer.team
+        self.create_invitations(email_ids=email_ids, invited_by=request.user)
+
+        return Response({
+            'invited': len(email_ids),
+            'results': serializer.results
+        }, status=status.HTTP_200_OK)
+
+    def create_invitations(self, email_ids, invited_by):
+        invitations = TeamInvitation.objects.create_invitations(
+            email_ids, invited_by, team=self.team, batch_size=self.INSERT_BATCH_SIZE
+        )
+        self.send_email_invites(invitations)
+
+    def send_email_invites(self, invitations):
+        # Emails are queued in the outbox, in batches, and sent by the dispatch_emails command.
+        site = get_current_site(self.request)
+        for batch in base_utils.chunked(invitations, self.MAIL_BATCH_SIZE):
+            OutboxEmail.objects.enqueue_many(
+                [invitation.get_email_invite(site, team=self.team) for invitation in batch]
+            )
+
+
+class TeamRowsMixin(object):
+    """
+    Common behaviour for endpoints listing rows of a team.
+
+    Rows are plain ``values()`` dicts rather than model instances, so no
+    serializer is involved. Subclasses define ``fields`` and ``get_rows``.
+
+    """
+
+    permission_classes = (permissions.IsAuthenticated, )
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication, )
+    fields = ()
+
+    def get_team(self):
+        try:
+            team = Team.objects.get(pk=self.kwargs['pk'])
+        except Team.DoesNotExist:
+            raise exceptions.NotFound("Team does not exist.")
+        if not self.has_team_permission(team, self.request.user):
+            raise exceptions.PermissionDenied("Operation not allowed.")
+        return team
+
+    def has_team_permission(self, team, user):
+        return team.has_member(user)
+
+    def get_rows(self, team):
+        raise NotImplementedError
+
+    def get_queryset(self):
+        return self.get_rows(self.get_team()).values(*self.fields)
+
+
+class TeamRowsListAPIView(TeamRowsMixin, generics.ListAPIView):
+    """
+    Lists team rows, keyset paginated on ``id``.
+
+    """
 
+    pagination_class = KeysetPagination
 
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(page)
+
+
+class TeamRowsExportAPIView(TeamRowsMixin, generics.GenericAPIView):
+    """
+    Streams all team rows as CSV (default) or NDJSON (``?file_format=ndjson``).
+    Rows are fetched in keyset chunks, so memory stays constant
+    regardless of team size.
+
+    """
+
+    EXPORT_CHUNK_SIZE = 2000
+
+    export_name = 'export'
+
+    def get(self, request, *args, **kwargs):
+        rows = streaming.keyset_iterator(
+            self.get_queryset(), key='id', chunk_size=self.EXPORT_CHUNK_SIZE
+        )
+
+        if request.query_params.get('file_format') == 'ndjson':
+            lines = streaming.ndjson_lines(rows, self.fields)
+            content_type, extension = 'application/x-ndjson', 'ndjson'
+        else:
+            lines = streaming.csv_lines(rows, self.fields)
+            content_type, extension = 'text/csv', 'csv'
+
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="team-%s-%s.%s"' % (
+            self.kwargs['pk'], self.export_name, extension
+        )
+        return response
+
+
+class TeamMembersMixin(object):
+
+    fields = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'date_joined')
+    export_name = 'members'
+
+    def get_rows(self, team):
+        return User.objects.filter(team=team)
+
+
+class TeamInvitationsMixin(object):
+
+    fields = ('id', 'email', 'status', 'invited_by_id', 'timestamp_created', 'timestamp_updated')
+    export_name = 'invitations'
+
+    def has_team_permission(self, team, user):
+        return team.has_invite_permissions(user)
+
+    def get_rows(self, team):
+        invitations = TeamInvitation.objects.for_team(team)
+        invitation_status = self.request.query_params.get('status')
+        if invitation_status is not None:
+            try:
+                invitations = invitations.filter(status=int(invitation_status))
+            except ValueError:
+                raise exceptions.ValidationError({'status': "Invalid status."})
+        return invitations
+
+
+class TeamMemberListAPIView(TeamMembersMixin, TeamRowsListAPIView):
+    """
+    Endpoint to list members of a team.
+
+    """
+
+
+class TeamMemberExportAPIView(TeamMembersMixin, TeamRowsExportAPIView):
+    """
+    Endpoint to export members of a team.
+
+    """
+
+
+class TeamInvitationListAPIView(TeamInvitationsMixin, TeamRowsListAPIView):
+    """
+    Endpoint to list invitations of a team. Filterable by ``status``.
+
+    """
+
+
+class TeamInvitationExportAPIView(TeamInvitationsMixin, TeamRowsExportAPIView):
+    """
+    Endpoint to export invitations of a team. Filterable by ``status``.
+
+    """
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class TeamsConfig(AppConfig):
+
+    name = 'teams'
+
+    def ready(self):
+        from django.db.models.signals import m2m_changed
+
+        from .models import Team
+        from .signals import update_team_membership
+
+        m2m_changed.connect(update_team_membership, sender=Team.members.through,
+                            dispatch_uid='teams_update_team_membership')
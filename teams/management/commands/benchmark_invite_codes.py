@@ -0,0 +1,70 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand
+
+from teams.models import (
+    INVITE_CODE_ALPHABET, INVITE_CODE_LENGTH, generate_invite_code, generate_invite_codes
+)
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark of the invite code generator, along with the collision
+    probability of the code space (birthday bound) and an empirical
+    collision check over ``--count`` generated codes, 10 million by default.
+
+    Every code of the check is generated on its own, with
+    ``generate_invite_code`` (``generate_invite_codes`` drops duplicates
+    within a call), and kept in a set: 10 million codes take about
+    2 minutes and 1.2 GB of memory.
+
+    """
+
+    help = 'Benchmarks invite code generation and checks for collisions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', dest='count', type=int, default=10 ** 7,
+                            help="Number of codes to generate for the collision check.")
+        parser.add_argument('--iterations', dest='iterations', type=int, default=100000,
+                            help="Number of codes to generate for the timing runs.")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        started = time.time()
+        for _ in range(iterations):
+            generate_invite_code()
+        self.report('generate_invite_code', iterations, time.time() - started)
+
+        started = time.time()
+        generate_invite_codes(iterations)
+        self.report('generate_invite_codes', iterations, time.time() - started)
+
+        space = len(INVITE_CODE_ALPHABET) ** INVITE_CODE_LENGTH
+        self.stdout.write("Code space: %s ** %s (~2 ** %.0f)" % (
+            len(INVITE_CODE_ALPHABET), INVITE_CODE_LENGTH, math.log(space, 2)
+        ))
+        for count in sorted(set([options['count'], 10 ** 7])):
+            self.stdout.write("Collision probability for %s codes: %.3e" % (
+                count, self.collision_probability(count, space)
+            ))
+
+        started = time.time()
+        codes = set()
+        for index in range(1, options['count'] + 1):
+            codes.add(generate_invite_code())
+            if index % 10 ** 6 == 0:
+                self.stdout.write("%s codes generated in %.0fs" % (index, time.time() - started))
+        self.stdout.write("Collisions among %s generated codes: %s" % (
+            options['count'], options['count'] - len(codes)
+        ))
+
+    def collision_probability(self, count, space):
+        # Birthday bound, 1 - exp(-n(n - 1) / 2N), with expm1 to keep precision for tiny values.
+        return -math.expm1(-float(count) * (count - 1) / (2.0 * space))
+
+    def report(self, name, iterations, elapsed):
+        self.stdout.write("%s: %s codes in %.3fs (%.2f us/code)" % (
+            name, iterations, elapsed, elapsed * 10 ** 6 / iterations
+        ))
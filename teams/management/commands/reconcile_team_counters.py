@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from teams.models import Team
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized team data (``Team.member_count``,
+    ``Team.pending_invitation_count`` and ``UserProfile.team``)
+    from the source tables, in chunks, and corrects any drift.
+
+    """
+
+    help = 'Recomputes team counters and profile teams, correcting any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        teams = Team.objects.reconcile_counters(chunk_size=options['chunk_size'])
+        profiles = Team.objects.reconcile_profile_teams(chunk_size=options['chunk_size'])
+        self.stdout.write("Corrected %s teams and %s profiles." % (teams, profiles))
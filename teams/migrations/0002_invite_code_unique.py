@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 03:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import teams.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='teaminvitation',
+            name='code',
+            field=models.CharField(default=teams.models.generate_invite_code, max_length=25, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='teaminvitation',
+            unique_together=set([]),
+        ),
+    ]
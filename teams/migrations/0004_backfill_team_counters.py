@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def backfill_team_counters(apps, schema_editor):
+    """
+    Fills the denormalized ``UserProfile.team``, ``TeamInvitation.team``
+    and team counters from the ``Team.members`` relation.
+
+    """
+
+    Team = apps.get_model('teams', 'Team')
+    TeamInvitation = apps.get_model('teams', 'TeamInvitation')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    Membership = Team.members.through
+
+    team_ids = list(Team.objects.order_by('pk').values_list('pk', flat=True))
+
+    # Teams in ascending order, so that users in several teams end up
+    # with the latest one, as ``user.team.last()`` does.
+    for team_id in team_ids:
+        user_ids = Membership.objects.filter(team_id=team_id).values('user_id')
+        UserProfile.objects.filter(user_id__in=user_ids).update(team=team_id)
+        TeamInvitation.objects.filter(invited_by_id__in=user_ids).update(team=team_id)
+
+    for team_id in team_ids:
+        Team.objects.filter(pk=team_id).update(
+            member_count=Membership.objects.filter(team_id=team_id).count(),
+            pending_invitation_count=TeamInvitation.objects.filter(team=team_id, status=0).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_userprofile_team'),
+        ('teams', '0003_team_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_team_counters, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,17 @@
-import base64
-import uuid
+import os
 import datetime
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Greatest, Lower
 from django.template.loader import render_to_string
 from django.core.mail import EmailMultiAlternatives
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from base import utils as base_utils
 from base import models as base_models
+from base import streaming as base_streaming
 
 User = get_user_model()
 
@@ -30,7 +32,92 @@ class TeamManager(models.Manager):
 
         """
 
-        return False if user.team.all().exists() else True
+        try:
+            return user.userprofile.team_id is None
+        except ObjectDoesNotExist:
+            # Users without a profile (e.g. created with createsuperuser).
+            return False if user.team.all().exists() else True
+
+    def recount_members(self, team_ids):
+        """
+        Recomputes ``member_count`` of given teams.
+
+        """
+
+        for team_id in team_ids:
+            self.filter(pk=team_id).update(
+                member_count=Team.members.through.objects.filter(team_id=team_id).count()
+            )
+
+    def decrement_pending_invitations(self, team_id, count=1):
+        """
+        Decrements ``pending_invitation_count`` of given team, down to 0:
+        invitations saved outside ``TeamInvitationManager`` aren't counted.
+
+        """
+
+        self.filter(pk=team_id).update(
+            pending_invitation_count=Greatest(models.F('pending_invitation_count') - count, models.Value(0))
+        )
+
+    def reconcile_counters(self, chunk_size=1000):
+        """
+        Recomputes ``member_count`` and ``pending_invitation_count`` of every team,
+        in chunks, and corrects the ones that drifted.
+        Returns the number of teams corrected.
+
+        """
+
+        corrected = 0
+        for teams in base_streaming.keyset_chunks(
+                self.values('id', 'member_count', 'pending_invitation_count'), chunk_size=chunk_size):
+            team_ids = [team['id'] for team in teams]
+            member_counts = dict(
+                Team.members.through.objects.filter(team_id__in=team_ids).values_list(
+                    'team_id'
+                ).annotate(count=models.Count('id')).order_by()
+            )
+            pending_counts = dict(
+                TeamInvitation.objects.filter(team_id__in=team_ids, status=TeamInvitation.PENDING).values_list(
+                    'team_id'
+                ).annotate(count=models.Count('id')).order_by()
+            )
+            for team in teams:
+                member_count = member_counts.get(team['id'], 0)
+                pending_invitation_count = pending_counts.get(team['id'], 0)
+                if (team['member_count'], team['pending_invitation_count']) != (member_count, pending_invitation_count):
+                    self.filter(pk=team['id']).update(
+                        member_count=member_count,
+                        pending_invitation_count=pending_invitation_count
+                    )
+                    corrected += 1
+        return corrected
+
+    def reconcile_profile_teams(self, chunk_size=1000):
+        """
+        Recomputes ``UserProfile.team`` of every profile from ``Team.members``,
+        in chunks, and corrects the ones that drifted.
+        Returns the number of profiles corrected.
+
+        """
+
+        from accounts.models import UserProfile
+
+        corrected = 0
+        for profiles in base_streaming.keyset_chunks(
+                UserProfile.objects.values('id', 'user_id', 'team_id'), chunk_size=chunk_size):
+            # The latest team of a user, as ``user.team.last()``.
+            teams = dict(
+                Team.members.through.objects.filter(
+                    user_id__in=[profile['user_id'] for profile in profiles]
+                ).values_list('user_id').annotate(team_id=models.Max('team_id')).order_by()
+            )
+            for profile in profiles:
+                team_id = teams.get(profile['user_id'])
+                if profile['team_id'] != team_id:
+                    UserProfile.objects.filter(pk=profile['id']).update(team=team_id)
+                    corrected += 1
+        return corrected
 
 
 class Team(base_models.TimeStampedModel):
@@ -59,6 +146,14 @@ class Team(base_models.TimeStampedModel):
         related_name='team'
     )
 
+    member_count = models.PositiveIntegerField(
+        default=0
+    )
+
+    pending_invitation_count = models.PositiveIntegerField(
+        default=0
+    )
+
     objects = TeamManager()
 
     class Meta:
@@ -79,6 +174,47 @@ class Team(base_models.TimeStampedModel):
             return True
         return False
 
+    def has_member(self, user):
+        """
+        Logic to check whether given user is a member of team.
+        Returns a boolean ``True`` if user is a member, otherwise ``False``.
+
+        """
+
+        return self.members.filter(pk=user.pk).exists()
+
+
+INVITE_CODE_LENGTH = 25
+
+INVITE_CODE_ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+# Random bytes at or above this value are dropped, so that ``byte % len(alphabet)``
+# picks every character of the alphabet with the same probability.
+_INVITE_CODE_BYTE_LIMIT = 256 - 256 % len(INVITE_CODE_ALPHABET)
+
+
+def generate_invite_codes(count):
+    """
+    Generates ``count`` distinct referral codes, for use with ``bulk_create``.
+    The characters are drawn from the OS random source (``os.urandom``)
+    in one read per batch, giving 62 ** 25 (about 2 ** 149) possible codes.
+
+    """
+
+    codes = set()
+    while len(codes) < count:
+        needed = (count - len(codes)) * INVITE_CODE_LENGTH
+        chars = [
+            INVITE_CODE_ALPHABET[byte % len(INVITE_CODE_ALPHABET)]
+            for byte in bytearray(os.urandom(needed + needed // 8 + INVITE_CODE_LENGTH))
+            if byte < _INVITE_CODE_BYTE_LIMIT
+        ]
+        for index in range(0, len(chars) - INVITE_CODE_LENGTH + 1, INVITE_CODE_LENGTH):
+            codes.add(''.join(chars[index:index + INVITE_CODE_LENGTH]))
+            if len(codes) == count:
+                break
+    return list(codes)
+
 
 def generate_invite_code():
     """
@@ -86,7 +222,7 @@ def generate_invite_code():
 
     """
 
-    return base64.urlsafe_b64encode(uuid.uuid1().bytes.encode("base64").rstrip())[:25]
+    return generate_invite_codes(1)[0]
 
 
 class TeamInvitationManager(models.Manager):
@@ -98,6 +234,14 @@ class TeamInvitationManager(models.Manager):
 
     """
 
+    def for_team(self, team):
+        """
+        Returns the ``TeamInvitation`` of given team.
+
+        """
+
+        return self.filter(team=team)
+
     def validate_code(self, email, value):
         """
         Validates the invite code with the email address.
@@ -113,6 +257,56 @@ class TeamInvitationManager(models.Manager):
             return None
         return invitation
 
+    MAX_CODE_ATTEMPTS = 3
+
+    def create_invitations(self, email_ids, invited_by, team=None, batch_size=None):
+        """
+        Creates a ``TeamInvitation`` for every given email address with
+        ``bulk_create``, generating the codes for the whole batch at once.
+        On a code conflict the codes are regenerated and the insert retried.
+        ``team`` defaults to the team of ``invited_by``.
+        Returns the list of created invitations.
+
+        """
+
+        team = team or invited_by.team.last()
+
+        for attempt in range(self.MAX_CODE_ATTEMPTS):
+            invitations = [
+                TeamInvitation(email=email_id, invited_by=invited_by, team=team, code=code)
+                for email_id, code in zip(email_ids, generate_invite_codes(len(email_ids)))
+            ]
+            try:
+                with transaction.atomic():
+                    invitations = self.bulk_create(invitations, batch_size=batch_size)
+                    if team:
+                        Team.objects.filter(pk=team.pk).update(
+                            pending_invitation_count=models.F('pending_invitation_count') + len(invitations)
+                        )
+                    return invitations
+            except IntegrityError:
+                if attempt == self.MAX_CODE_ATTEMPTS - 1:
+                    raise
+
+    def pending_emails(self, emails, chunk_size=500):
+        """
+        Returns the set of given email addresses having a pending invitation,
+        compared case-insensitively and lowercased.
+        Looked up in chunks of ``chunk_size`` addresses per query.
+
+        """
+
+        pending = set()
+        for chunk in base_utils.chunked(sorted(set(email.lower() for email in emails)), chunk_size):
+            pending.update(
+                self.annotate(
+                    email_lower=Lower('email')
+                ).filter(
+                    email_lower__in=chunk, status=TeamInvitation.PENDING
+                ).values_list('email_lower', flat=True)
+            )
+        return pending
+
     def accept_invitation(self, invitation):
         """
         Accepts the invitation.
@@ -121,22 +315,42 @@ class TeamInvitationManager(models.Manager):
         """
 
         if invitation.status == TeamInvitation.PENDING:
-            invitation.status = TeamInvitation.ACCEPTED
-            invitation.save()
+            with transaction.atomic():
+                invitation.status = TeamInvitation.ACCEPTED
+                invitation.save()
+                if invitation.team_id:
+                    Team.objects.decrement_pending_invitations(invitation.team_id)
             return True
         return False
 
+    @transaction.atomic
+    def close_pending_invitations(self, invitations, status):
+        """
+        Moves the pending invitations among given ones to ``status``,
+        keeping ``Team.pending_invitation_count`` in sync.
+
+        """
+
+        invitations = invitations.filter(status=TeamInvitation.PENDING)
+        counts = list(
+            invitations.exclude(team=None).values('team').annotate(
+                count=models.Count('id')
+            ).order_by()
+        )
+
+        invitations.update(status=status)
+
+        for row in counts:
+            Team.objects.decrement_pending_invitations(row['team'], row['count'])
+
     def decline_pending_invitations(self, email_ids):
         """
         Declines all pending invitations for given email addresses.
 
         """
 
-        self.filter(
-            email__in=email_ids,
-            status=TeamInvitation.PENDING
-        ).update(
-            status=TeamInvitation.DECLINED
+        self.close_pending_invitations(
+            self.filter(email__in=email_ids), TeamInvitation.DECLINED
         )
 
     def expired(self):
@@ -161,8 +375,7 @@ class TeamInvitationManager(models.Manager):
 
         """
 
-        invitations = self.expired()
-        invitations.update(status=TeamInvitation.EXPIRED)
+        self.close_pending_invitations(self.expired(), TeamInvitation.EXPIRED)
 
 
 class TeamInvitation(base_models.TimeStampedModel):
@@ -191,11 +404,19 @@ class TeamInvitation(base_models.TimeStampedModel):
         on_delete=models.SET_NULL
     )
 
+    team = models.ForeignKey(
+        Team,
+        related_name='invitations',
+        null=True,
+        on_delete=models.CASCADE
+    )
+
     email = models.EmailField()
 
     code = models.CharField(
-        max_length=25,
-        default=generate_invite_code
+        max_length=INVITE_CODE_LENGTH,
+        default=generate_invite_code,
+        unique=True
     )
 
     status = models.IntegerField(
@@ -206,16 +427,17 @@ class TeamInvitation(base_models.TimeStampedModel):
     objects = TeamInvitationManager()
 
     class Meta:
-        unique_together = ('email', 'code',)
         verbose_name = u'team invitation'
         verbose_name_plural = u'team invitations'
 
     def __str__(self):
         return "To : %s | From %s" % (self.email, self.invited_by)
 
-    def send_email_invite(self, site):
+    def get_email_invite(self, site, team=None):
         """
-        Send a team invitation email to person referred by ``email``
+        Builds the team invitation email to person referred by ``email``.
+        ``team`` may be given to avoid looking it up for every invitation.
+
         """
 
         context = {
@@ -223,7 +445,7 @@ class TeamInvitation(base_models.TimeStampedModel):
             'site_name': getattr(settings, 'SITE_NAME', None),
             'code': self.code,
             'invited_by': self.invited_by,
-            'team': self.invited_by.team.last(),
+            'team': team or self.team or self.invited_by.team.last(),
             'email': self.email
         }
 
@@ -239,4 +461,11 @@ class TeamInvitation(base_models.TimeStampedModel):
 
         msg = EmailMultiAlternatives(subject, "", settings.DEFAULT_FROM_EMAIL, [self.email])
         msg.attach_alternative(message, "text/html")
-        msg.send()
+        return msg
+
+    def send_email_invite(self, site, team=None):
+        """
+        Queues a team invitation email to person referred by ``email``
+        """
+
+        base_models.OutboxEmail.objects.enqueue(self.get_email_invite(site, team=team))
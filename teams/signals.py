@@ -0,0 +1,71 @@
+from django.db import models
+
+from accounts.models import UserProfile
+from teams.models import Team
+
+
+def set_latest_team(user_ids):
+    """
+    Sets ``UserProfile.team`` of given users to the latest team they are a
+    member of (as ``Team.objects.reconcile_profile_teams`` does), or ``None``.
+
+    """
+
+    user_ids = list(user_ids)
+    latest = Team.members.through.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+        team_id=models.Max('team_id')
+    ).order_by().values_list('user_id', 'team_id')
+    by_team = {}
+    for user_id, team_id in latest:
+        by_team.setdefault(team_id, []).append(user_id)
+    for team_id, team_user_ids in by_team.items():
+        UserProfile.objects.filter(user_id__in=team_user_ids).exclude(team=team_id).update(team=team_id)
+    UserProfile.objects.filter(user_id__in=user_ids).exclude(
+        user_id__in=[user_id for team_user_ids in by_team.values() for user_id in team_user_ids]
+    ).exclude(team=None).update(team=None)
+
+
+def update_team_membership(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Keeps ``Team.member_count`` and ``UserProfile.team`` (the latest team of
+    the user) in sync with ``Team.members``.
+
+    ``instance`` is a team for ``team.members.add(...)`` and a user for
+    ``user.team.add(...)`` (reverse); ``pk_set`` holds the pks on the other side.
+
+    """
+
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_team_ids = list(instance.team.values_list('pk', flat=True))
+        else:
+            instance._cleared_member_ids = list(instance.members.values_list('pk', flat=True))
+        return
+
+    if action in ('post_add', 'post_remove') and not pk_set:
+        # Django leaves out the pks already added (or not there to remove).
+        return
+
+    if not reverse:
+        team = instance
+        if action == 'post_add':
+            Team.objects.filter(pk=team.pk).update(member_count=models.F('member_count') + len(pk_set))
+            set_latest_team(pk_set)
+        elif action == 'post_remove':
+            set_latest_team(pk_set)
+            Team.objects.recount_members([team.pk])
+        elif action == 'post_clear':
+            set_latest_team(getattr(team, '_cleared_member_ids', []))
+            Team.objects.filter(pk=team.pk).update(member_count=0)
+        return
+
+    user = instance
+    if action == 'post_add':
+        Team.objects.filter(pk__in=pk_set).update(member_count=models.F('member_count') + 1)
+        set_latest_team([user.pk])
+    elif action == 'post_remove':
+        set_latest_team([user.pk])
+        Team.objects.recount_members(pk_set)
+    elif action == 'post_clear':
+        set_latest_team([user.pk])
+        Team.objects.recount_members(getattr(user, '_cleared_team_ids', []))